@@ -3,7 +3,10 @@ import os
 import re
 import sys
 import threading
+import bisect
 import difflib
+import functools
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter import ttk
@@ -54,6 +57,20 @@ except Exception:
     Image = None
     ImageOps = None
 
+# عتبة تكيّفية أدق مع المسح غير المتساوي الإضاءة (اختياري: pip install opencv-python-headless)
+try:
+    import cv2
+    import numpy as np
+except Exception:
+    cv2 = None
+    np = None
+
+# --- Compare (optional fast backend for large texts) ---
+try:
+    from diff_match_patch import diff_match_patch
+except Exception:
+    diff_match_patch = None
+
 
 # =========================
 # 0) Resources helper (PyInstaller-safe paths)
@@ -91,10 +108,10 @@ def safe_photoimage(path: str, max_w: int = 120, max_h: int = 120):
 # =========================
 TASHKEEL_RE = re.compile(r'[\u0617-\u061A\u064B-\u0652\u0670\u0653-\u0655]')
 
-def remove_tashkeel(text: str) -> str:
-    return re.sub(TASHKEEL_RE, '', text)
-
 def normalize_newlines(text: str) -> str:
+    # معظم النصوص بلا \r أصلًا: فحص واحد يغني عن نسختين كاملتين من النص
+    if '\r' not in text:
+        return text
     return text.replace('\r\n', '\n').replace('\r', '\n')
 
 
@@ -149,13 +166,21 @@ ARABIC_DIGITS_TO_LATIN = {
 }
 LATIN_TO_ARABIC_DIGITS = {v:k for k,v in ARABIC_DIGITS_TO_LATIN.items()}
 
-ALEF_FORMS = {'ا', 'أ', 'إ', 'آ'}
-
 
 # =========================
 # 3) عكس التحويل (بريل -> عربي) بدون تضارب
 # =========================
-BR2AR_LETTERS = {v: k for k, v in AR2BR_LETTERS.items()}
+# الخلية التي تشترك فيها عدة حروف تُعاد إلى شكل واحد ثابت:
+# ⠁ -> ا (وليس أ/إ/آ)، ⠊ -> ي (وليس ى)، ⠓ -> ه (وليس ة)
+BR2AR_LETTERS = {
+    '⠁':'ا',
+    '⠃':'ب','⠞':'ت','⠹':'ث','⠚':'ج','⠱':'ح','⠭':'خ',
+    '⠙':'د','⠮':'ذ','⠗':'ر','⠵':'ز','⠎':'س','⠩':'ش',
+    '⠯':'ص','⠷':'ض','⠾':'ط','⠿':'ظ','⠫':'ع','⠣':'غ',
+    '⠋':'ف','⠟':'ق','⠅':'ك','⠇':'ل','⠍':'م','⠝':'ن',
+    '⠓':'ه','⠺':'و','⠊':'ي',
+    '⠄':'ء','⠺⠄':'ؤ','⠊⠄':'ئ',
+}
 
 EXTRA_BR2AR = {
     '⠂': '،',
@@ -175,9 +200,6 @@ BR_TO_DIGIT = {v: k for k, v in DIGIT_TO_BR.items()}
 # =========================
 # 4) محرك التحويل
 # =========================
-def normalize_digits_to_latin(text: str) -> str:
-    return ''.join(ARABIC_DIGITS_TO_LATIN.get(ch, ch) for ch in text)
-
 def unknown_policy_apply(ch: str, policy: str) -> str:
     if policy == "pass":
         return ch
@@ -185,103 +207,138 @@ def unknown_policy_apply(ch: str, policy: str) -> str:
         return ""
     return "⍰"
 
+class _PolicyTable(dict):
+    """جدول str.translate يطبّق سياسة المجهول على أي محرف غير موجود فيه."""
+
+    def __init__(self, mapping: dict, policy: str):
+        super().__init__(mapping)
+        self.policy = policy
+        # نصوص OCR مليئة بحروف لاتينية: نملأ ASCII مسبقًا كي لا تمر عبر __missing__
+        for cp in range(0x80):
+            if cp not in self:
+                self[cp] = unknown_policy_apply(chr(cp), policy)
+
+    def __missing__(self, cp: int) -> str:
+        # نحفظ الناتج فيبقى البحث التالي عن المحرف نفسه داخل C
+        value = self[cp] = unknown_policy_apply(chr(cp), self.policy)
+        return value
+
+# "لا" وأشكال الألف لا تحتاج فرعًا خاصًا: ناتجها هو خلية ل + خلية الألف كما في الجدول
+_AR2BR_TRANS = str.maketrans({k: v for k, v in AR2BR.items() if len(k) == 1})
+# حذف التشكيل مدموج في جدول الترجمة نفسه بدل مرور مستقل على النص
+_TASHKEEL_CHARS = ''.join(ch for ch in map(chr, range(0x0600, 0x0700)) if TASHKEEL_RE.match(ch))
+_AR2BR_TRANS_NO_TASHKEEL = {**_AR2BR_TRANS, **dict.fromkeys(map(ord, _TASHKEEL_CHARS))}
+# الأرقام الهندية تُترجم مباشرة إلى خلايا بريل مع اللاتينية، بلا مرور مسبق لتوحيدها
+# سلسلة الرقم هي \d (كل أرقام يونيكود العشرية، مثل str.isdecimal) في الوحدات الثلاث؛
+# ما ليس لاتينيًا أو هنديًا منها يمر بسياسة المجهول بعد إشارة الرقم
+_DIGIT_TO_BR_TRANS = str.maketrans({
+    **DIGIT_TO_BR,
+    **{ar: DIGIT_TO_BR[lat] for ar, lat in ARABIC_DIGITS_TO_LATIN.items()},
+    **{ch: None for ch in _TASHKEEL_CHARS},
+})
+_DIGIT_RUN_RE = re.compile(r'(\d+)')
+# عند حذف التشكيل: حركة بين رقمين لا تقطع سلسلة الأرقام (كما لو حُذفت أولًا)
+_DIGIT_RUN_NO_TASHKEEL_RE = re.compile(r'(\d(?:[' + _TASHKEEL_CHARS + r']*\d)*)')
+_AR2BR_TABLES: dict[str, _PolicyTable] = {}
+_AR2BR_NO_TASHKEEL_TABLES: dict[str, _PolicyTable] = {}
+_DIGIT_TABLES: dict[str, _PolicyTable] = {}
+
+def _policy_table(cache: dict, mapping: dict, policy: str) -> _PolicyTable:
+    table = cache.get(policy)
+    if table is None:
+        table = cache[policy] = _PolicyTable(mapping, policy)
+    return table
+
 def arabic_to_braille(text: str, keep_tashkeel: bool = False, unknown_policy: str = "qmark") -> str:
     text = normalize_newlines(text)
-    if not keep_tashkeel:
-        text = remove_tashkeel(text)
-    text = normalize_digits_to_latin(text)
-
-    out = []
-    i = 0
-    in_number = False
-
-    while i < len(text):
-        if i + 1 < len(text) and text[i] == 'ل' and text[i+1] in ALEF_FORMS:
-            in_number = False
-            out.append(AR2BR.get('ل', unknown_policy_apply('ل', unknown_policy)))
-            out.append(AR2BR.get(text[i+1], unknown_policy_apply(text[i+1], unknown_policy)))
-            i += 2
-            continue
-
-        ch = text[i]
-
-        if ch.isdigit():
-            if not in_number:
-                out.append(NUM_SIGN)
-                in_number = True
-            out.append(DIGIT_TO_BR.get(ch, unknown_policy_apply(ch, unknown_policy)))
-            i += 1
-            continue
-
-        in_number = False
-
-        if ch in AR2BR:
-            out.append(AR2BR[ch])
-        else:
-            out.append(unknown_policy_apply(ch, unknown_policy))
-
-        i += 1
-
-    return ''.join(out)
+    if keep_tashkeel:
+        run_re = _DIGIT_RUN_RE
+        table = _policy_table(_AR2BR_TABLES, _AR2BR_TRANS, unknown_policy)
+    else:
+        run_re = _DIGIT_RUN_NO_TASHKEEL_RE
+        table = _policy_table(_AR2BR_NO_TASHKEEL_TABLES, _AR2BR_TRANS_NO_TASHKEEL, unknown_policy)
+
+    digits = _policy_table(_DIGIT_TABLES, _DIGIT_TO_BR_TRANS, unknown_policy)
+
+    # الأجزاء الزوجية نص عادي، والفردية سلاسل أرقام تُسبق بإشارة الرقم
+    parts = run_re.split(text)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].translate(table)
+    for i in range(1, len(parts), 2):
+        parts[i] = NUM_SIGN + parts[i].translate(digits)
+
+    return ''.join(parts)
+
+# إشارة الرقم تُحذف دائمًا، وخلايا الأرقام بعدها تصبح أرقامًا حتى أول خلية غير رقمية
+_BR2AR_TRANS = str.maketrans({
+    **EXTRA_BR2AR,
+    **{k: v for k, v in BR2AR_LETTERS.items() if len(k) == 1},
+    ' ': ' ', '\n': '\n', '\t': '\t',
+})
+_BR_DIGITS_LATIN_TRANS = str.maketrans(BR_TO_DIGIT)
+_BR_DIGITS_ARABIC_TRANS = str.maketrans({k: LATIN_TO_ARABIC_DIGITS[v] for k, v in BR_TO_DIGIT.items()})
+_NUM_RUN_RE = re.compile(NUM_SIGN + '([' + ''.join(BR_TO_DIGIT) + ']*)')
+_BR2AR_TABLES: dict[str, _PolicyTable] = {}
 
 def braille_to_arabic(braille_text: str, arabic_digits: bool = False, unknown_policy: str = "qmark") -> str:
     braille_text = normalize_newlines(braille_text)
 
-    def unknown_out(cell: str) -> str:
-        if unknown_policy == "pass":
-            return cell
-        if unknown_policy == "drop":
-            return ""
-        return "⍰"
-
-    out = []
-    i = 0
-    in_number = False
-
-    while i < len(braille_text):
-        ch = braille_text[i]
-
-        if ch == NUM_SIGN:
-            in_number = True
-            i += 1
-            continue
-
-        if ch in [' ', '\n', '\t']:
-            in_number = False
-            out.append(ch)
-            i += 1
-            continue
-
-        if in_number:
-            digit = BR_TO_DIGIT.get(ch)
-            if digit is not None:
-                out.append(LATIN_TO_ARABIC_DIGITS[digit] if arabic_digits else digit)
-                i += 1
-                continue
-            in_number = False
-            continue
+    parts = _NUM_RUN_RE.split(braille_text)
+    table = _policy_table(_BR2AR_TABLES, _BR2AR_TRANS, unknown_policy)
+    digits = _BR_DIGITS_ARABIC_TRANS if arabic_digits else _BR_DIGITS_LATIN_TRANS
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].translate(table)
+    for i in range(1, len(parts), 2):
+        parts[i] = parts[i].translate(digits)
 
-        out.append(BR2AR_LETTERS.get(ch, EXTRA_BR2AR.get(ch, unknown_out(ch))))
-        i += 1
-
-    return ''.join(out)
+    return ''.join(parts)
 
 
 # =========================
 # 5) TXT helpers
 # =========================
-def convert_file(path_in: str, path_out: str, direction: str, keep_tashkeel: bool,
-                 arabic_digits: bool, unknown_policy_ar2br: str, unknown_policy_br2ar: str):
-    with open(path_in, 'r', encoding='utf-8') as f:
-        content = normalize_newlines(f.read())
-
-    if direction == 'AR2BR':
-        converted = arabic_to_braille(content, keep_tashkeel=keep_tashkeel, unknown_policy=unknown_policy_ar2br)
-    else:
-        converted = braille_to_arabic(content, arabic_digits=arabic_digits, unknown_policy=unknown_policy_br2ar)
+CONVERT_CHUNK_SIZE = 1 << 20
+# محارف قد تكمل سلسلة أرقام بدأت قبلها؛ لا نقطع الدفعة قبل أي منها
+# (في عربي->بريل تُفحص أرقام \d نفسها بـ isdecimal، فهي أكثر من أن تُعدّ هنا)
+_AR2BR_RUN_CHARS = frozenset(_TASHKEEL_CHARS)
+_BR2AR_RUN_CHARS = frozenset(NUM_SIGN + ''.join(BR_TO_DIGIT))
 
-    with open(path_out, 'w', encoding='utf-8') as f:
-        f.write(converted)
+def convert_file(path_in: str, path_out: str, direction: str, keep_tashkeel: bool,
+                 arabic_digits: bool, unknown_policy_ar2br: str, unknown_policy_br2ar: str,
+                 progress_cb=None, cancel_flag=None):
+    def convert(text: str) -> str:
+        if ar2br:
+            return arabic_to_braille(text, keep_tashkeel=keep_tashkeel, unknown_policy=unknown_policy_ar2br)
+        return braille_to_arabic(text, arabic_digits=arabic_digits, unknown_policy=unknown_policy_br2ar)
+
+    # الحالة الوحيدة التي تعبر المحارف هي سلاسل الأرقام، فنقطع كل دفعة قبل آخر سلسلة مفتوحة
+    # ونؤجل بقيتها للدفعة التالية؛ هكذا يبقى المؤجَّل صغيرًا حتى في ملف بلا أسطر
+    # (وضع النص يوحّد \r\n و \r إلى \n أثناء القراءة)
+    ar2br = direction == 'AR2BR'
+    run_chars = _AR2BR_RUN_CHARS if ar2br else _BR2AR_RUN_CHARS
+    total = os.path.getsize(path_in)
+    with open(path_in, 'r', encoding='utf-8', buffering=CONVERT_CHUNK_SIZE) as fin, \
+            open(path_out, 'w', encoding='utf-8', buffering=CONVERT_CHUNK_SIZE) as fout:
+        carry = ''
+        for chunk in iter(lambda: fin.read(CONVERT_CHUNK_SIZE), ''):
+            if cancel_flag and cancel_flag.get("stop"):
+                break
+            chunk = carry + chunk
+            cut = len(chunk)
+            while cut and (chunk[cut - 1] in run_chars or ar2br and chunk[cut - 1].isdecimal()):
+                cut -= 1
+            carry = chunk[cut:]
+            if cut:
+                fout.write(convert(chunk[:cut]))
+            if progress_cb:
+                done = min(fin.buffer.tell(), total)
+                progress_cb(done, total, f"تحويل الملف: {done // 1024:,} / {total // 1024:,} KB")
+        else:
+            if carry:
+                fout.write(convert(carry))
+            return
+    # أُلغي التحويل: لا نترك ملف ناتج ناقصًا
+    os.remove(path_out)
 
 
 # =========================
@@ -291,16 +348,11 @@ def export_to_word(text: str, path_out: str):
     if Document is None:
         raise RuntimeError("python-docx غير مثبت. ثبّته بالأمر: pip install python-docx")
     doc = Document()
-    for line in normalize_newlines(text).split('\n'):
-        doc.add_paragraph(line)
+    # فقرة واحدة: python-docx يحوّل كل \n إلى فاصل سطر، وهو أسرع بكثير من فقرة لكل سطر
+    doc.add_paragraph(normalize_newlines(text))
     doc.save(path_out)
 
-def _shape_arabic_for_pdf_if_possible(text: str) -> str:
-    if arabic_reshaper and get_display:
-        reshaped = arabic_reshaper.reshape(text)
-        return get_display(reshaped)
-    return text
-
+@functools.lru_cache(maxsize=1)
 def _try_register_pdf_font() -> tuple[str, str]:
     if pdfmetrics is None or TTFont is None:
         return ("Helvetica", "reportlab غير متاح لتسجيل خطوط TTF.")
@@ -328,7 +380,8 @@ def _try_register_pdf_font() -> tuple[str, str]:
         try:
             if path and os.path.exists(path):
                 name = "UIFont"
-                pdfmetrics.registerFont(TTFont(name, path))
+                if name not in pdfmetrics.getRegisteredFontNames():
+                    pdfmetrics.registerFont(TTFont(name, path))
                 return (name, f"تم استخدام الخط: {os.path.basename(path)}")
         except Exception:
             continue
@@ -344,20 +397,25 @@ def export_to_pdf(text: str, path_out: str, assume_arabic: bool = True) -> str:
     c = canvas.Canvas(path_out, pagesize=A4)
     width, height = A4
     margin = 50
-    y = height - margin
-
-    c.setFont(font_name, 14)
+    leading = 18
+    lines_per_page = int((height - 2 * margin) // leading) + 1
 
-    lines = normalize_newlines(text).split('\n')
-    for line in lines:
-        if y < margin:
+    text = normalize_newlines(text)
+    # التشكيل دفعة واحدة للنص كله (لا يتخطى الأسطر)، أما get_display فيبقى لكل سطر
+    # لأنه يعكس ترتيب الأسطر لو طُبّق على النص كاملاً
+    if assume_arabic and arabic_reshaper and get_display:
+        lines = [get_display(line) for line in arabic_reshaper.reshape(text).split('\n')]
+    else:
+        lines = text.split('\n')
+    # كائن نص واحد لكل صفحة بدل drawString لكل سطر
+    for page_no, first in enumerate(range(0, len(lines), lines_per_page)):
+        if page_no:
             c.showPage()
-            c.setFont(font_name, 14)
-            y = height - margin
-
-        draw_line = _shape_arabic_for_pdf_if_possible(line) if assume_arabic else line
-        c.drawString(margin, y, draw_line)
-        y -= 18
+        tx = c.beginText(margin, height - margin)
+        tx.setFont(font_name, 14, leading)
+        for draw_line in lines[first:first + lines_per_page]:
+            tx.textLine(draw_line)
+        c.drawText(tx)
 
     c.save()
     return note
@@ -366,10 +424,14 @@ def export_to_pdf(text: str, path_out: str, assume_arabic: bool = True) -> str:
 # =========================
 # 7) PDF reading + OCR (improved)
 # =========================
-def ensure_tesseract_configured():
-    """Try to auto-detect tesseract.exe on Windows if not in PATH."""
+# مسار tesseract بعد التحقق منه أول مرة؛ لا نخزّن الفشل كي يُكتشف التثبيت أثناء الجلسة
+_TESSERACT_CMD = ""
+
+def ensure_tesseract_configured() -> str:
+    """Try to auto-detect tesseract.exe on Windows if not in PATH. Returns the verified path or ""."""
+    global _TESSERACT_CMD
     if pytesseract is None:
-        return
+        return ""
     if os.name == "nt":
         candidates = [
             r"C:\Program Files\Tesseract-OCR\tesseract.exe",
@@ -379,22 +441,23 @@ def ensure_tesseract_configured():
             current = getattr(pytesseract.pytesseract, "tesseract_cmd", "")
         except Exception:
             current = ""
+        if current and current == _TESSERACT_CMD:
+            return current
         if current and os.path.exists(current):
-            return
+            _TESSERACT_CMD = current
+            return current
         for p in candidates:
             if os.path.exists(p):
-                pytesseract.pytesseract.tesseract_cmd = p
-                return
+                pytesseract.pytesseract.tesseract_cmd = _TESSERACT_CMD = p
+                return p
+    return ""
 
 def tesseract_ready() -> tuple[bool, str]:
     if pytesseract is None:
         return False, "pytesseract غير مثبت داخل البيئة."
-    ensure_tesseract_configured()
-    cmd = getattr(getattr(pytesseract, "pytesseract", None), "tesseract_cmd", "")
+    cmd = ensure_tesseract_configured()
     if os.name == "nt":
-        if cmd and os.path.exists(cmd):
-            return True, cmd
-        return True, "PATH"
+        return True, cmd or "PATH"
     return True, "OK"
 
 def _parse_page_range(user_text: str, page_count: int) -> tuple[int, int]:
@@ -414,11 +477,23 @@ def _parse_page_range(user_text: str, page_count: int) -> tuple[int, int]:
     if p > page_count: p = page_count
     return (p - 1, p)
 
-def pdf_extract_text_range(path_pdf: str, start0: int, end0: int, progress_cb=None) -> str:
+PDF_TEXT_MIN_CHARS = 60
+PDF_PROBE_PAGES = 3
+
+def pdf_extract_text_range(path_pdf: str, start0: int, end0: int, progress_cb=None,
+                           probe_only: bool = False) -> str:
+    """
+    Extract the text layer of pages [start0, end0).
+    With probe_only=True, look at no more than PDF_PROBE_PAGES pages and stop as soon as
+    PDF_TEXT_MIN_CHARS characters were found (enough to tell a text PDF from a scanned one).
+    """
     if fitz is None:
         raise RuntimeError("PyMuPDF غير مثبت. ثبّت: pip install pymupdf")
     doc = fitz.open(path_pdf)
     parts = []
+    found = 0
+    if probe_only:
+        end0 = min(end0, start0 + PDF_PROBE_PAGES)
     total = max(1, end0 - start0)
 
     for i, pno in enumerate(range(start0, end0), start=1):
@@ -426,27 +501,115 @@ def pdf_extract_text_range(path_pdf: str, start0: int, end0: int, progress_cb=No
         t = page.get_text("text") or ""
         if t.strip():
             parts.append(t)
+            found += len(t.strip())
         if progress_cb:
             progress_cb(i, total, f"استخراج نص: صفحة {pno+1}/{doc.page_count}")
+        if probe_only and found >= PDF_TEXT_MIN_CHARS:
+            break
 
     doc.close()
     return normalize_newlines("\n".join(parts)).strip()
 
-def _preprocess_for_ocr(img: "Image.Image") -> "Image.Image":
-    img = ImageOps.grayscale(img)
-    img = ImageOps.autocontrast(img)
-    img = img.point(lambda p: 255 if p > 160 else 0)
-    img = img.resize((img.width * 2, img.height * 2))
-    return img
+OCR_THRESHOLD = 160
+
+def _autocontrast_threshold_lut(histogram: list[int]) -> list[int]:
+    # نفس حساب ImageOps.autocontrast (cutoff=0) مدموجًا مع العتبة في جدول واحد،
+    # فيمرّ Pillow على البكسلات مرة واحدة بدل مرتين
+    used = [i for i, count in enumerate(histogram) if count]
+    if not used or used[-1] <= used[0]:
+        return [255 if i > OCR_THRESHOLD else 0 for i in range(256)]
+    lo, hi = used[0], used[-1]
+    scale = 255.0 / (hi - lo)
+    offset = -lo * scale
+    return [255 if min(255, max(0, int(i * scale + offset))) > OCR_THRESHOLD else 0 for i in range(256)]
+
+# زمن tesseract يتناسب مع عدد البكسلات؛ الصفحات المرسومة بهذه الدقة أو أعلى لا تُكبَّر
+OCR_MIN_SOURCE_DPI = 150
+
+OCR_ADAPTIVE_BLOCK = 31
+OCR_ADAPTIVE_C = 10
+
+def _preprocess_for_ocr(img: "Image.Image", source_dpi: int | None = None) -> "Image.Image":
+    if img.mode != "L":
+        img = ImageOps.grayscale(img)
+    if cv2 is not None:
+        # تمريرة واحدة في OpenCV: عتبة محلية بدل عتبة ثابتة للصفحة كلها
+        bw = cv2.adaptiveThreshold(np.asarray(img), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY, OCR_ADAPTIVE_BLOCK, OCR_ADAPTIVE_C)
+        img = Image.fromarray(bw).convert("1", dither=Image.NONE)
+    else:
+        # الناتج أبيض/أسود فقط: صورة بت واحد (mode "1") أصغر بثماني مرات من L،
+        # وهذا ما يكتبه pytesseract إلى ملف مؤقت لكل صفحة
+        img = img.point(_autocontrast_threshold_lut(img.histogram()), "1")
+    if source_dpi is None:
+        scale = 2.0
+    elif source_dpi < OCR_MIN_SOURCE_DPI:
+        scale = OCR_MIN_SOURCE_DPI / source_dpi
+    else:
+        return img
+    # الصورة ثنائية بعد العتبة: التكبير بأقرب جار يكفي وأرخص بكثير من bicubic
+    return img.resize((round(img.width * scale), round(img.height * scale)), Image.NEAREST)
+
+# عدة عمليات tesseract تعمل بالتوازي (صفحة لكل عامل)، فنمنع كل واحدة من فتح خيوط OpenMP
+# بعدد الأنوية أيضًا وإلا تتزاحم على المعالج؛ يمكن تجاوز ذلك بضبط المتغير في البيئة
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+OCR_PREFETCH = 2
+
+# كل عامل عملية tesseract بذاكرتها ونموذج لغتها؛ بعد ~4 عمال يقل الكسب وتكبر الذاكرة
+OCR_MAX_WORKERS = 4
+
+def _ocr_workers(page_count: int) -> int:
+    # os.cpu_count() يعيد أنوية الجهاز كله حتى لو قُيّدت العملية ببعضها
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, min(page_count, cpus, OCR_MAX_WORKERS))
+
+_PIXMAP_MODES = {1: "L", 3: "RGB", 4: "RGBA"}
+
+def _pixmap_to_image(pix):
+    # نسخ البكسلات الخام كما هي (مع مراعاة stride) بدل المرور بـ PNG
+    mode = _PIXMAP_MODES.get(pix.n)
+    if mode is None:
+        raise RuntimeError(f"صيغة صورة غير مدعومة من PyMuPDF (n={pix.n})")
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples, "raw", mode, pix.stride)
+
+OCR_RETRY_CONF = 70
+
+def _ocr_text_and_conf(img, lang: str, config: str) -> tuple[str, float]:
+    """OCR a page with image_to_data: (text, mean word confidence)."""
+    data = pytesseract.image_to_data(img, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+    lines: dict[tuple, list[str]] = {}
+    confs = []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word.strip():
+            continue
+        confs.append(conf)
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+    # سطر فارغ بين الفقرات والكتل كما يفعل image_to_string
+    out, prev = [], None
+    for key, words in lines.items():
+        if prev is not None and key[:2] != prev:
+            out.append("")
+        out.append(" ".join(words))
+        prev = key[:2]
+    text = "\n".join(out)
+    # صفحة بلا كلمات لا تستحق إعادة المحاولة بدقة أعلى
+    return text, (sum(confs) / len(confs) if confs else 100.0)
 
 def pdf_ocr_to_text_range(
     path_pdf: str,
     start0: int,
     end0: int,
     lang: str = "ara+eng",
-    dpi: int = 300,
+    dpi: int = 200,
     progress_cb=None,
-    psm: int = 6
+    psm: int = 6,
+    retry_dpi: int | None = None
 ) -> str:
     if fitz is None:
         raise RuntimeError("PyMuPDF غير مثبت. ثبّت: pip install pymupdf")
@@ -460,49 +623,243 @@ def pdf_ocr_to_text_range(
         raise RuntimeError("OCR غير جاهز: " + how)
 
     doc = fitz.open(path_pdf)
-    parts = []
-    zoom = dpi / 72.0
-    mat = fitz.Matrix(zoom, zoom)
     total = max(1, end0 - start0)
 
     config = f"--oem 3 --psm {psm}"
 
-    for i, pno in enumerate(range(start0, end0), start=1):
-        page = doc.load_page(pno)
-        pix = page.get_pixmap(matrix=mat, alpha=False)
-        img_bytes = pix.tobytes("png")
-
-        import io
-        img = Image.open(io.BytesIO(img_bytes))
-        img = _preprocess_for_ocr(img)
-
-        text = pytesseract.image_to_string(img, lang=lang, config=config)
-        if text.strip():
-            parts.append(text)
-
+    # التحويل إلى صورة يتم هنا بالتتابع (fitz غير آمن مع الخيوط)،
+    # أما tesseract فعملية مستقلة لكل صفحة فتعمل الصفحات بالتوازي
+    workers = _ocr_workers(end0 - start0)
+    results: dict[int, str] = {}
+    pending = {}
+    low_conf: list[int] = []
+    done_count = 0
+
+    def finish(fut):
+        nonlocal done_count
+        pno, pass_dpi = pending.pop(fut)
+        out = fut.result()
+        if isinstance(out, tuple):
+            out, conf = out
+            if conf < OCR_RETRY_CONF:
+                low_conf.append(pno)
+        results[pno] = out
+        done_count += 1
         if progress_cb:
-            progress_cb(i, total, f"OCR: صفحة {pno+1}/{doc.page_count} (DPI {dpi})")
+            progress_cb(done_count, total, f"OCR: صفحة {pno+1}/{doc.page_count} (DPI {pass_dpi})")
+
+    def run_pass(pages, pass_dpi, ocr_fn):
+        zoom = pass_dpi / 72.0
+        mat = fitz.Matrix(zoom, zoom)
+        # نخبر tesseract بالدقة الفعلية للصورة (PNG المؤقت بلا DPI) فلا يقدّرها ويعيد تحجيمها
+        pass_config = f"{config} --dpi {max(pass_dpi, OCR_MIN_SOURCE_DPI)}"
+        for pno in pages:
+            page = doc.load_page(pno)
+            # تدرّج رمادي مباشرة من fitz (بايت لكل بكسل) ومن دون ترميز/فك PNG
+            pix = page.get_pixmap(matrix=mat, colorspace=fitz.csGRAY, alpha=False)
+            img = _preprocess_for_ocr(_pixmap_to_image(pix), source_dpi=pass_dpi)
+            del pix
+
+            pending[pool.submit(ocr_fn, img, lang=lang, config=pass_config)] = (pno, pass_dpi)
+
+            # طابور محدود: صفحات جاهزة تنتظر العمال (OCR_PREFETCH) بينما نرسم التالية،
+            # ولا نتجاوزها حتى لا تتراكم الصور في الذاكرة
+            if len(pending) >= workers + OCR_PREFETCH:
+                ready, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in ready:
+                    finish(fut)
+
+        for fut in as_completed(list(pending)):
+            finish(fut)
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # مع retry_dpi: تمريرة أولى بدقة dpi، ثم إعادة الصفحات ضعيفة الثقة فقط بالدقة الأعلى
+        if retry_dpi and retry_dpi > dpi:
+            run_pass(range(start0, end0), dpi, _ocr_text_and_conf)
+            if low_conf:
+                total += len(low_conf)
+                run_pass(sorted(low_conf), retry_dpi, pytesseract.image_to_string)
+        else:
+            run_pass(range(start0, end0), dpi, pytesseract.image_to_string)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        doc.close()
 
-    doc.close()
+    parts = [results[pno] for pno in sorted(results) if results[pno].strip()]
     return normalize_newlines("\n".join(parts)).strip()
 
 def pdf_to_text_auto_range(path_pdf: str, start0: int, end0: int, progress_cb=None) -> tuple[str, str]:
+    # فحص سريع لأول صفحات النطاق؛ الاستخراج الكامل فقط إذا كان الملف نصّيًا
     direct = ""
     try:
-        direct = pdf_extract_text_range(path_pdf, start0, end0, progress_cb=progress_cb)
+        probe = pdf_extract_text_range(path_pdf, start0, end0, probe_only=True)
+        if len(probe) >= PDF_TEXT_MIN_CHARS:
+            direct = pdf_extract_text_range(path_pdf, start0, end0, progress_cb=progress_cb)
     except Exception:
         direct = ""
 
-    if len(direct) >= 60:
+    if len(direct) >= PDF_TEXT_MIN_CHARS:
         return direct, "PDF نصّي (استخراج مباشر)"
 
-    ocr = pdf_ocr_to_text_range(path_pdf, start0, end0, lang="ara+eng", dpi=300, progress_cb=progress_cb, psm=6)
+    ocr = pdf_ocr_to_text_range(path_pdf, start0, end0, lang="ara+eng", dpi=200, progress_cb=progress_cb, psm=6,
+                                retry_dpi=300)
     return ocr, "PDF صورة/سكان (OCR محسّن)"
 
 
 # =========================
 # 8) GUI (No Splash) + safe logo
 # =========================
+def run_with_progress(root, work_fn, done_fn, title: str = "جاري المعالجة…", indeterminate: bool = False):
+    """
+    Run work_fn(progress_cb, cancel_flag) on a worker thread behind a modal progress window,
+    then done_fn(result) on the Tk thread. A cancelled run never reaches done_fn.
+    """
+    prog = tk.Toplevel(root)
+    prog.title(title)
+    prog.geometry("540x170")
+    prog.resizable(False, False)
+    prog.transient(root)
+    prog.grab_set()
+
+    msg = tk.StringVar(value="بدء…")
+    tk.Label(prog, textvariable=msg, anchor="w").pack(fill="x", padx=12, pady=(10, 6))
+
+    pb2 = ttk.Progressbar(prog, length=500, mode="indeterminate" if indeterminate else "determinate")
+    pb2.pack(padx=12, pady=10)
+    if indeterminate:
+        pb2.start(10)
+    else:
+        pb2["value"] = 0
+
+    cancel_flag = {"stop": False}
+
+    def on_cancel():
+        cancel_flag["stop"] = True
+        msg.set("سيتم الإيقاف بعد الخطوة الحالية…")
+
+    tk.Button(prog, text="إلغاء", command=on_cancel, width=10).pack(pady=6)
+
+    def progress_cb(i, total, text):
+        def _ui():
+            msg.set(text)
+            pb2["maximum"] = total
+            pb2["value"] = i
+        root.after(0, _ui)
+
+    def worker():
+        try:
+            result = work_fn(progress_cb, cancel_flag)
+            if not cancel_flag["stop"]:
+                root.after(0, lambda: done_fn(result))
+        except RuntimeError as e:
+            root.after(0, lambda m=str(e): messagebox.showinfo("تم", m))
+        except Exception as e:
+            root.after(0, lambda m=str(e): messagebox.showerror("خطأ", m))
+        finally:
+            root.after(0, prog.destroy)
+
+    threading.Thread(target=worker, daemon=True).start()
+
+# تحت هذا الحجم تنتهي العملية في أجزاء من الثانية فلا داعي لنافذة تقدّم
+BACKGROUND_MIN_CHARS = 200_000
+# النصوص الأكبر من دفعة واحدة تُدرج في مربع النص على دفعات بين أحداث الواجهة
+TEXT_INSERT_CHUNK = 64 * 1024
+
+# فوق هذا الحجم لا نشغّل ratio() الكاملة (تربيعية) بل تقديرًا سريعًا
+COMPARE_MAX_CHARS = 200_000
+# ومع توفر diff-match-patch تُستعمل بدل difflib فوق هذا الحجم
+COMPARE_DMP_CHARS = 50_000
+COMPARE_DMP_TIMEOUT = 1.0
+
+def _dmp_compare(a: str, b: str) -> tuple[float, list[str]]:
+    """Ratio + diff lines from diff-match-patch (character diff, cleaned up semantically)."""
+    dmp = diff_match_patch()
+    dmp.Diff_Timeout = COMPARE_DMP_TIMEOUT
+    diffs = dmp.diff_main(a, b)
+    dmp.diff_cleanupSemantic(diffs)
+
+    changed = sum(len(t) for op, t in diffs if op != 0)
+    ratio = 1.0 - changed / (len(a) + len(b))
+
+    out = []
+    for op, t in diffs:
+        if op == 0:
+            # المقاطع المتطابقة لا تُعرض، يكفي فاصل مكانها
+            out.append("@@")
+            continue
+        mark = "+" if op > 0 else "-"
+        out += [mark + line for line in t.split("\n")]
+    return ratio, out
+
+class _CachedSequenceMatcher(difflib.SequenceMatcher):
+    """
+    SequenceMatcher whose find_longest_match slices b2j[a[i]] to [blo, bhi) once per
+    distinct element (bisect on the sorted index list), instead of range-checking every
+    j on every row. Helps with lines that repeat a lot (blank lines, separators).
+    """
+
+    def find_longest_match(self, alo=0, ahi=None, blo=0, bhi=None):
+        a, b, b2j, isbjunk = self.a, self.b, self.b2j, self.bjunk.__contains__
+        if ahi is None:
+            ahi = len(a)
+        if bhi is None:
+            bhi = len(b)
+        besti, bestj, bestsize = alo, blo, 0
+        in_range = {}
+        nothing = ()
+        j2len = {}
+        for i in range(alo, ahi):
+            elt = a[i]
+            js = in_range.get(elt)
+            if js is None:
+                js = b2j.get(elt, nothing)
+                js = in_range[elt] = js[bisect.bisect_left(js, blo):bisect.bisect_left(js, bhi)]
+            j2lenget = j2len.get
+            newj2len = {}
+            for j in js:
+                k = newj2len[j] = j2lenget(j - 1, 0) + 1
+                if k > bestsize:
+                    besti, bestj, bestsize = i - k + 1, j - k + 1, k
+            j2len = newj2len
+
+        # نفس التمديد الذي يجريه difflib: عناصر غير مهملة ثم المهملة على الطرفين
+        while besti > alo and bestj > blo and not isbjunk(b[bestj - 1]) and a[besti - 1] == b[bestj - 1]:
+            besti, bestj, bestsize = besti - 1, bestj - 1, bestsize + 1
+        while besti + bestsize < ahi and bestj + bestsize < bhi and \
+                not isbjunk(b[bestj + bestsize]) and a[besti + bestsize] == b[bestj + bestsize]:
+            bestsize += 1
+        while besti > alo and bestj > blo and isbjunk(b[bestj - 1]) and a[besti - 1] == b[bestj - 1]:
+            besti, bestj, bestsize = besti - 1, bestj - 1, bestsize + 1
+        while besti + bestsize < ahi and bestj + bestsize < bhi and \
+                isbjunk(b[bestj + bestsize]) and a[besti + bestsize] == b[bestj + bestsize]:
+            bestsize += 1
+
+        return difflib.Match(besti, bestj, bestsize)
+
+def _unified_diff(sm: difflib.SequenceMatcher, a: list[str], b: list[str], fromfile: str, tofile: str) -> list[str]:
+    """Same output as difflib.unified_diff(lineterm=""), built from an existing matcher."""
+    def span(start, stop):
+        length = stop - start
+        if length == 1:
+            return f"{start + 1}"
+        return f"{start + 1 if length else start},{length}"
+
+    out = []
+    for group in sm.get_grouped_opcodes(3):
+        if not out:
+            out += [f"--- {fromfile}", f"+++ {tofile}"]
+        out.append(f"@@ -{span(group[0][1], group[-1][2])} +{span(group[0][3], group[-1][4])} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                out += [" " + line for line in a[i1:i2]]
+                continue
+            if tag in ("replace", "delete"):
+                out += ["-" + line for line in a[i1:i2]]
+            if tag in ("replace", "insert"):
+                out += ["+" + line for line in b[j1:j2]]
+    return out
+
 def run_gui():
     root = tk.Tk()
     root.title(f"{APP_TITLE_AR} — {APP_SUBTITLE}")
@@ -518,7 +875,7 @@ def run_gui():
 
     # OCR options
     ocr_lang = tk.StringVar(value="ara+eng")
-    ocr_dpi = tk.IntVar(value=300)
+    ocr_dpi = tk.IntVar(value=200)
     ocr_psm = tk.IntVar(value=6)
 
     # ========= Header (logo + title) =========
@@ -604,61 +961,96 @@ def run_gui():
     status_bar.pack(fill="x", padx=10, pady=(0, 6))
 
     def update_counts(note: str = ""):
+        # لا نُكمل الإدراج المعلّق هنا: كل إدراج مجزّأ يحدّث العدّاد نفسه عند اكتماله
         src = in_text.get("1.0", "end-1c")
         dst = out_text.get("1.0", "end-1c")
         base = f"الأصلي: {len(src)} حرف | الناتج: {len(dst)} حرف"
         status.set(base + (f"   —   {note}" if note else ""))
 
+    def _cancel_fill(widget):
+        """يوقف إدراجًا مجزّأً لم يكتمل ويعيد سجل التراجع إلى وضعه الطبيعي."""
+        job = getattr(widget, "_fill_job", None)
+        if job is not None:
+            root.after_cancel(job)
+            widget._fill_job = None
+            widget.configure(autoseparators=True)
+
+    def get_text(widget) -> str:
+        """نص المربع كاملًا: أي إدراج مجزّأ معلّق يُكمَل أولًا دفعة واحدة."""
+        job = getattr(widget, "_fill_job", None)
+        if job is not None:
+            root.after_cancel(job)
+            widget._fill_finish()
+        return widget.get("1.0", "end-1c")
+
+    def set_text(widget, text: str, note: str = ""):
+        _cancel_fill(widget)
+        # الاستبدال كله خطوة تراجع واحدة بدل سجل تراجع لكل دفعة
+        widget.configure(autoseparators=False)
+        widget.delete("1.0", "end")
+
+        def step(pos: int, size: int = TEXT_INSERT_CHUNK):
+            widget.insert("end", text[pos:pos + size])
+            pos += size
+            if pos < len(text):
+                widget._fill_job = root.after(1, step, pos)
+                widget._fill_finish = lambda: step(pos, len(text) - pos)
+                return
+            widget._fill_job = None
+            widget.edit_separator()
+            widget.configure(autoseparators=True)
+            update_counts(note)
+
+        step(0)
+
+    def run_sized(size: int, work_fn, done_fn, title: str):
+        if size < BACKGROUND_MIN_CHARS:
+            done_fn(work_fn(None, {"stop": False}))
+        else:
+            run_with_progress(root, work_fn, done_fn, title=title, indeterminate=True)
+
     def do_convert():
-        src = in_text.get("1.0", "end-1c")
+        src = get_text(in_text)
+        # نقرأ متغيرات Tk هنا (خيط الواجهة) لا داخل العامل
         if direction.get() == "AR2BR":
-            res = arabic_to_braille(src, keep_tashkeel=keep_tashkeel.get(), unknown_policy=unknown_policy_ar2br.get())
+            kt, pol = keep_tashkeel.get(), unknown_policy_ar2br.get()
+            work = lambda cb, cancel: arabic_to_braille(src, keep_tashkeel=kt, unknown_policy=pol)
         else:
-            res = braille_to_arabic(src, arabic_digits=arabic_digits_out.get(), unknown_policy=unknown_policy_br2ar.get())
-        out_text.delete("1.0", "end")
-        out_text.insert("1.0", res)
-        update_counts("تم التحويل")
+            ad, pol = arabic_digits_out.get(), unknown_policy_br2ar.get()
+            work = lambda cb, cancel: braille_to_arabic(src, arabic_digits=ad, unknown_policy=pol)
+
+        def done(res):
+            set_text(out_text, res, "تم التحويل")
+
+        run_sized(len(src), work, done, "جاري التحويل…")
 
     def swap():
-        a = in_text.get("1.0", "end-1c")
-        b = out_text.get("1.0", "end-1c")
-        in_text.delete("1.0", "end")
-        out_text.delete("1.0", "end")
-        in_text.insert("1.0", b)
-        out_text.insert("1.0", a)
-        update_counts("تم التبديل")
+        a = get_text(in_text)
+        b = get_text(out_text)
+        set_text(in_text, b, "تم التبديل")
+        set_text(out_text, a, "تم التبديل")
 
     def clear_all():
+        _cancel_fill(in_text)
+        _cancel_fill(out_text)
         in_text.delete("1.0", "end")
         out_text.delete("1.0", "end")
         update_counts("تم المسح")
 
     def copy_output():
-        data = out_text.get("1.0", "end-1c")
+        data = get_text(out_text)
         root.clipboard_clear()
         root.clipboard_append(data)
         update_counts("تم نسخ الناتج")
 
-    def compare_texts():
-        a = in_text.get("1.0", "end-1c")
-        b = out_text.get("1.0", "end-1c")
-
-        if not a.strip() or not b.strip():
-            messagebox.showwarning("تنبيه", "ضع نصًا في الصندوقين (أو حوّل أولًا) ثم اضغط مقارنة.")
-            return
-
-        ratio = difflib.SequenceMatcher(None, a, b).ratio()
-        percent = round(ratio * 100, 2)
-
-        a_lines = a.splitlines()
-        b_lines = b.splitlines()
-        diff_lines = list(difflib.unified_diff(a_lines, b_lines, fromfile="الأصلي", tofile="الناتج", lineterm=""))
-
+    def show_compare(percent: float, diff_lines: list[str], quick: bool = False):
         win = tk.Toplevel(root)
         win.title(f"مقارنة النص — تطابق {percent}%")
         win.geometry("980x600")
 
         tk.Label(win, text=f"نسبة التطابق التقريبية: {percent}%", font=("Arial", 12, "bold")).pack(anchor="w", padx=10, pady=8)
+        if quick:
+            tk.Label(win, text="النصان كبيران جدًا — مقارنة سريعة فقط", fg="darkorange").pack(anchor="w", padx=10)
 
         box = tk.Text(win, wrap="none")
         box.pack(fill="both", expand=True, padx=10, pady=10)
@@ -669,6 +1061,42 @@ def run_gui():
             box.insert("1.0", "لا توجد اختلافات (أو النصان متطابقان تقريبًا).")
         box.config(state="disabled")
 
+    def compare_texts():
+        a = get_text(in_text)
+        b = get_text(out_text)
+
+        if not a.strip() or not b.strip():
+            messagebox.showwarning("تنبيه", "ضع نصًا في الصندوقين (أو حوّل أولًا) ثم اضغط مقارنة.")
+            return
+
+        # نصّان متطابقان: لا داعي لـ difflib إطلاقًا
+        if a == b:
+            show_compare(100.0, [])
+            return
+
+        def work(cb, cancel):
+            if diff_match_patch is not None and max(len(a), len(b)) > COMPARE_DMP_CHARS:
+                ratio, diff_lines = _dmp_compare(a, b)
+                return round(ratio * 100, 2), diff_lines, False
+
+            # المقارنة على مستوى الأسطر: عناصر أقل بكثير من المحارف
+            a_lines = a.splitlines()
+            b_lines = b.splitlines()
+            quick = max(len(a), len(b)) > COMPARE_MAX_CHARS
+            # autojunk يعدّ أي سطر يتكرر في أكثر من 1% من النص "مهملًا" (أسطر فارغة، فواصل...)
+            # فتخرج النسبة خاطئة؛ نُبقيه فقط في المقارنة السريعة للنصوص الضخمة
+            # الناتج غالبًا لا يتغير بين ضغطات "مقارنة": نعيد استخدام فهرس seq2 (b2j) المبني سابقًا
+            sm = getattr(root, "_seqmatcher", None)
+            if sm is None or sm.autojunk != quick or root._last_b != b:
+                sm = root._seqmatcher = _CachedSequenceMatcher(None, autojunk=quick)
+                sm.set_seq2(b_lines)
+                root._last_b = b
+            sm.set_seq1(a_lines)
+            ratio = sm.quick_ratio() if quick else sm.ratio()
+            return round(ratio * 100, 2), _unified_diff(sm, a_lines, b_lines, "الأصلي", "الناتج"), quick
+
+        run_sized(max(len(a), len(b)), work, lambda res: show_compare(*res), "جاري المقارنة…")
+
     def about_app():
         ok, how = tesseract_ready()
         ocr_state = "جاهز" if ok else f"غير جاهز ({how})"
@@ -688,10 +1116,15 @@ def run_gui():
         )
         if not path:
             return
-        with open(path, 'r', encoding='utf-8') as f:
-            in_text.delete("1.0", "end")
-            in_text.insert("1.0", normalize_newlines(f.read()))
-        update_counts(f"تم فتح: {os.path.basename(path)}")
+
+        def work(cb, cancel):
+            with open(path, 'r', encoding='utf-8') as f:
+                return normalize_newlines(f.read())
+
+        def done(txt):
+            set_text(in_text, txt, f"تم فتح: {os.path.basename(path)}")
+
+        run_sized(os.path.getsize(path), work, done, "جاري فتح الملف…")
 
     def save_output_txt():
         path = filedialog.asksaveasfilename(
@@ -701,7 +1134,7 @@ def run_gui():
         )
         if not path:
             return
-        data = out_text.get("1.0", "end-1c")
+        data = get_text(out_text)
         with open(path, 'w', encoding='utf-8') as f:
             f.write(data)
         update_counts(f"تم حفظ: {os.path.basename(path)}")
@@ -720,18 +1153,24 @@ def run_gui():
         )
         if not pout:
             return
-        convert_file(
-            pin, pout,
+        args = (
             direction.get(),
             keep_tashkeel.get(),
             arabic_digits_out.get(),
             unknown_policy_ar2br.get(),
             unknown_policy_br2ar.get()
         )
-        update_counts(f"تم تحويل ملف كامل: {os.path.basename(pin)}")
+
+        def work(progress_cb, cancel_flag):
+            convert_file(pin, pout, *args, progress_cb=progress_cb, cancel_flag=cancel_flag)
+
+        def done(_):
+            update_counts(f"تم تحويل ملف كامل: {os.path.basename(pin)}")
+
+        run_with_progress(root, work, done, title="تحويل ملف TXT")
 
     def export_word_gui():
-        data = out_text.get("1.0", "end-1c")
+        data = get_text(out_text)
         if not data.strip():
             messagebox.showwarning("تنبيه", "لا يوجد ناتج للتصدير. اضغط تحويل أولًا.")
             return
@@ -749,7 +1188,7 @@ def run_gui():
             messagebox.showerror("خطأ", str(e))
 
     def export_pdf_gui():
-        data = out_text.get("1.0", "end-1c")
+        data = get_text(out_text)
         if not data.strip():
             messagebox.showwarning("تنبيه", "لا يوجد ناتج للتصدير. اضغط تحويل أولًا.")
             return
@@ -761,17 +1200,28 @@ def run_gui():
         if not path:
             return
 
+        if canvas is None or A4 is None:
+            messagebox.showerror("خطأ", "reportlab غير مثبت. ثبّته بالأمر: pip install reportlab")
+            return
+
         assume_arabic = (direction.get() == "BR2AR")
-        try:
-            note = export_to_pdf(data, path, assume_arabic=assume_arabic)
+
+        def done(note):
             extra = []
             if assume_arabic and (arabic_reshaper is None or get_display is None):
                 extra.append("لتشكيل العربية داخل PDF ثبّت: arabic-reshaper و python-bidi")
             if note:
                 extra.append(note)
             update_counts(" | ".join(extra) if extra else f"تم تصدير PDF: {os.path.basename(path)}")
-        except Exception as e:
-            messagebox.showerror("خطأ", str(e))
+
+        # reportlab بطيء نسبيًا مع الخطوط TTF: التصدير دائمًا في الخلفية
+        run_with_progress(
+            root,
+            lambda cb, cancel: export_to_pdf(data, path, assume_arabic=assume_arabic),
+            done,
+            title="جاري تصدير PDF…",
+            indeterminate=True,
+        )
 
     # ---------- PDF loader ----------
     def load_pdf():
@@ -827,49 +1277,6 @@ def run_gui():
         info = tk.StringVar(value="")
         tk.Label(dlg, textvariable=info, fg="blue").pack(anchor="w", padx=12, pady=(6, 0))
 
-        def run_with_progress(work_fn, done_fn):
-            prog = tk.Toplevel(root)
-            prog.title("جاري المعالجة…")
-            prog.geometry("540x170")
-            prog.resizable(False, False)
-            prog.transient(root)
-            prog.grab_set()
-
-            msg = tk.StringVar(value="بدء…")
-            tk.Label(prog, textvariable=msg, anchor="w").pack(fill="x", padx=12, pady=(10, 6))
-
-            pb2 = ttk.Progressbar(prog, length=500, mode="determinate")
-            pb2.pack(padx=12, pady=10)
-            pb2["value"] = 0
-
-            cancel_flag = {"stop": False}
-
-            def on_cancel():
-                cancel_flag["stop"] = True
-                msg.set("سيتم الإيقاف بعد الصفحة الحالية…")
-
-            tk.Button(prog, text="إلغاء", command=on_cancel, width=10).pack(pady=6)
-
-            def progress_cb(i, total, text):
-                def _ui():
-                    msg.set(text)
-                    pb2["maximum"] = total
-                    pb2["value"] = i
-                root.after(0, _ui)
-
-            def worker():
-                try:
-                    result = work_fn(progress_cb, cancel_flag)
-                    root.after(0, lambda: done_fn(result))
-                except RuntimeError as e:
-                    root.after(0, lambda: messagebox.showinfo("تم", str(e)))
-                except Exception as e:
-                    root.after(0, lambda: messagebox.showerror("خطأ", str(e)))
-                finally:
-                    root.after(0, prog.destroy)
-
-            threading.Thread(target=worker, daemon=True).start()
-
         def start_load():
             if page_mode.get() == "all":
                 s0, e0 = (0, page_count)
@@ -906,14 +1313,12 @@ def run_gui():
 
             def done(result):
                 txt, method_used = result
-                in_text.delete("1.0", "end")
-                in_text.insert("1.0", txt if txt else "")
-                update_counts(f"تم فتح PDF — {method_used}")
+                set_text(in_text, txt or "", f"تم فتح PDF — {method_used}")
                 if not (txt or "").strip():
                     messagebox.showwarning("تنبيه", "تمت العملية لكن لم يتم استخراج نص. قد تكون جودة السكان ضعيفة أو OCR غير جاهز.")
 
             dlg.destroy()
-            run_with_progress(work, done)
+            run_with_progress(root, work, done)
 
         def update_hint(*_):
             if mode.get() == "ocr":
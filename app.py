@@ -1,6 +1,14 @@
 # -*- coding: utf-8 -*-
+import os
 import re
 import io
+import functools
+import hashlib
+import importlib
+import importlib.util
+import statistics
+import queue
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 import streamlit as st
 
@@ -12,56 +20,29 @@ APP_COMPANY = "أكاديمية الموهبة المشتركة"
 APP_VERSION = "1.3.0"
 
 # =========================
-# Optional libraries
+# Optional libraries (lazy)
 # =========================
-# Word export
-try:
-    from docx import Document
-except Exception:
-    Document = None
-
-# PDF export
-try:
-    from reportlab.pdfgen import canvas as rl_canvas
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-except Exception:
-    rl_canvas = None
-    A4 = None
-    pdfmetrics = None
-    TTFont = None
-
-# Better Arabic shaping (PDF export)
-try:
-    import arabic_reshaper
-    from bidi.algorithm import get_display
-except Exception:
-    arabic_reshaper = None
-    get_display = None
-
-# OCR
-try:
-    import pytesseract
-except Exception:
-    pytesseract = None
-
-try:
-    from PIL import Image
-except Exception:
-    Image = None
-
-# PDF text extraction
-try:
-    from pypdf import PdfReader
-except Exception:
-    PdfReader = None
-
-# PDF rendering (for scanned PDFs -> images -> OCR)
-try:
-    import fitz  # PyMuPDF
-except Exception:
-    fitz = None
+# لا نستورد مكتبات PDF/OCR/التصدير عند بدء التطبيق: أغلب الاستخدام تحويل نص فقط،
+# وكل مكتبة تُستورد عند أول حاجة إليها (وبعدها من sys.modules مباشرة)
+_OPTIONAL: dict = {}
+
+def _optional(module: str, attr: str | None = None):
+    """Import an optional dependency on first use; None when it is not installed."""
+    key = (module, attr)
+    if key not in _OPTIONAL:
+        try:
+            mod = importlib.import_module(module)
+            _OPTIONAL[key] = getattr(mod, attr) if attr else mod
+        except Exception:
+            _OPTIONAL[key] = None
+    return _OPTIONAL[key]
+
+def _installed(module: str) -> bool:
+    """Availability check for the UI without importing the module."""
+    try:
+        return importlib.util.find_spec(module) is not None
+    except Exception:
+        return False
 
 
 # =========================
@@ -70,11 +51,11 @@ except Exception:
 TASHKEEL_RE = re.compile(r"[\u0617-\u061A\u064B-\u0652\u0670\u0653-\u0655]")
 
 def normalize_newlines(text: str) -> str:
+    # أغلب النصوص بلا \r: نتجنب نسختين كاملتين من النص
+    if "\r" not in text:
+        return text
     return text.replace("\r\n", "\n").replace("\r", "\n")
 
-def remove_tashkeel(text: str) -> str:
-    return re.sub(TASHKEEL_RE, "", text)
-
 
 # =========================
 # 2) Arabic <-> Braille maps
@@ -149,109 +130,115 @@ EXTRA_BR2AR = {
     "⠶":'"',
 }
 
-ALEF_FORMS = {"ا","أ","إ","آ"}
-
-def normalize_digits_to_latin(text: str) -> str:
-    return "".join(ARABIC_DIGITS_TO_LATIN.get(ch, ch) for ch in text)
-
 def unsupported_report_ar_to_br(text: str, keep_tashkeel: bool) -> list[str]:
     """يعطي قائمة فريدة بالرموز غير المدعومة في تحويل عربي->بريل."""
-    t = normalize_newlines(text)
-    if not keep_tashkeel:
-        t = remove_tashkeel(t)
-    t = normalize_digits_to_latin(t)
+    ar2br = AR2BR
     bad = []
-    for ch in t:
-        if ch.isdigit():
+    # نفحص كل محرف مختلف مرة واحدة، فلا حاجة لتمريرات حذف التشكيل وتوحيد الأرقام على النص كله:
+    # الأرقام الهندية أرقام أصلًا، و\r يصبح \n عند التحويل
+    for ch in set(text):
+        # نفس أرقام سلاسل التحويل (\d)
+        if ch.isdecimal():
+            continue
+        if ch in ar2br:
             continue
-        if ch in AR2BR:
+        if not keep_tashkeel and TASHKEEL_RE.match(ch):
             continue
         # تجاهل محارف التحكم
-        if ch in ("\n", "\t"):
+        if ch in ("\n", "\r", "\t"):
             continue
         bad.append(ch)
-    # فريد + مرتب
-    return sorted(set(bad))
+    return sorted(bad)
 
 
 # =========================
 # 3) Conversion engine
 # =========================
+class _FallbackTable(dict):
+    """جدول str.translate يعيد قيمة ثابتة لأي محرف غير موجود فيه (None = تمرير المحرف كما هو)."""
+
+    def __init__(self, mapping: dict, fallback: str | None):
+        super().__init__(mapping)
+        self.fallback = fallback
+
+    def __missing__(self, cp: int) -> str:
+        value = self[cp] = chr(cp) if self.fallback is None else self.fallback
+        return value
+
+# حذف التشكيل مدموج في جداول الترجمة نفسها بدل مرور مستقل على النص
+_TASHKEEL_CHARS = "".join(ch for ch in map(chr, range(0x0600, 0x0700)) if TASHKEEL_RE.match(ch))
+_DROP_TASHKEEL = dict.fromkeys(map(ord, _TASHKEEL_CHARS))
+
+# "لا" وأشكال الألف: ناتجها خلية ل + خلية الألف كما في الجدول، فلا تحتاج فرعًا خاصًا
+_AR2BR_BASE = str.maketrans({k: v for k, v in AR2BR.items() if len(k) == 1})
+_AR2BR_TABLES = {
+    True: _FallbackTable(_AR2BR_BASE, "⍰"),
+    False: _FallbackTable({**_AR2BR_BASE, **_DROP_TASHKEEL}, "⍰"),
+}
+# سلسلة الرقم هي \d (كل أرقام يونيكود العشرية، مثل str.isdecimal) في الوحدات الثلاث؛
+# ما ليس لاتينيًا أو هنديًا منها يصبح ⍰ بعد إشارة الرقم
+_DIGIT_TABLE = _FallbackTable({
+    **str.maketrans(DIGIT_TO_BR),
+    **str.maketrans({ar: DIGIT_TO_BR[lat] for ar, lat in ARABIC_DIGITS_TO_LATIN.items()}),
+    **_DROP_TASHKEEL,
+}, "⍰")
+# عند حذف التشكيل: حركة بين رقمين لا تقطع سلسلة الأرقام (كما لو حُذفت أولًا)
+_DIGIT_RUN_RES = {
+    True: re.compile(r"(\d+)"),
+    False: re.compile(r"(\d(?:[" + _TASHKEEL_CHARS + r"]*\d)*)"),
+}
+
 def arabic_to_braille(text: str, keep_tashkeel: bool = False) -> str:
     text = normalize_newlines(text)
-    if not keep_tashkeel:
-        text = remove_tashkeel(text)
-    text = normalize_digits_to_latin(text)
-
-    out = []
-    i = 0
-    in_number = False
-
-    while i < len(text):
-        # "لا" وأشكال الألف
-        if i + 1 < len(text) and text[i] == "ل" and text[i+1] in ALEF_FORMS:
-            in_number = False
-            out.append(AR2BR.get("ل", "⍰"))
-            out.append(AR2BR.get(text[i+1], "⍰"))
-            i += 2
-            continue
-
-        ch = text[i]
-
-        if ch.isdigit():
-            if not in_number:
-                out.append(NUM_SIGN)
-                in_number = True
-            out.append(DIGIT_TO_BR.get(ch, "⍰"))
-            i += 1
-            continue
-
-        in_number = False
-        out.append(AR2BR.get(ch, "⍰"))
-        i += 1
-
-    return "".join(out)
-
-def braille_to_arabic(braille_text: str, arabic_digits: bool = True) -> str:
+    keep_tashkeel = bool(keep_tashkeel)
+    table = _AR2BR_TABLES[keep_tashkeel]
+
+    # الأجزاء الزوجية نص عادي، والفردية سلاسل أرقام (لاتينية أو هندية) تُسبق بإشارة الرقم
+    parts = _DIGIT_RUN_RES[keep_tashkeel].split(text)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].translate(table)
+    for i in range(1, len(parts), 2):
+        parts[i] = NUM_SIGN + parts[i].translate(_DIGIT_TABLE)
+
+    return "".join(parts)
+
+# BR2AR له الأولوية على EXTRA_BR2AR كما في البحث القديم؛ جدول مدمج واحد لكل سياسة للمجهول
+_BR2AR_MERGED = str.maketrans({
+    **EXTRA_BR2AR,
+    **{k: v for k, v in BR2AR.items() if len(k) == 1},
+})
+_BR2AR_TABLES = {
+    "qmark": _FallbackTable(_BR2AR_MERGED, "؟"),
+    "pass": _FallbackTable(_BR2AR_MERGED, None),
+    "drop": _FallbackTable(_BR2AR_MERGED, ""),
+}
+_BR_DIGIT_CELLS = "".join(BR_TO_DIGIT)
+_BR_DIGITS_LATIN_TABLE = str.maketrans({**BR_TO_DIGIT, NUM_SIGN: None})
+_BR_DIGITS_ARABIC_TABLE = str.maketrans({
+    **{k: LATIN_TO_ARABIC_DIGITS[v] for k, v in BR_TO_DIGIT.items()},
+    NUM_SIGN: None,
+})
+# رموز التنصيص الثنائية، أو إشارة رقم تتبعها خلايا أرقام (وإشارات رقم مكررة)
+_BR_TOKEN_RE = re.compile("(⠦⠦|⠴⠴|" + NUM_SIGN + "[" + NUM_SIGN + _BR_DIGIT_CELLS + "]*)")
+
+def braille_to_arabic(braille_text: str, arabic_digits: bool = True, unknown_policy: str = "qmark") -> str:
     braille_text = normalize_newlines(braille_text)
-    out = []
-    i = 0
-    in_number = False
-
-    while i < len(braille_text):
-        # « »
-        if i + 1 < len(braille_text):
-            two = braille_text[i:i+2]
-            if two == "⠦⠦":
-                out.append("«"); i += 2; in_number = False; continue
-            if two == "⠴⠴":
-                out.append("»"); i += 2; in_number = False; continue
-
-        ch = braille_text[i]
-
-        if ch == NUM_SIGN:
-            in_number = True
-            i += 1
-            continue
-
-        if ch in (" ", "\n", "\t"):
-            in_number = False
-            out.append(ch)
-            i += 1
-            continue
-
-        if in_number:
-            digit = BR_TO_DIGIT.get(ch)
-            if digit is not None:
-                out.append(LATIN_TO_ARABIC_DIGITS[digit] if arabic_digits else digit)
-                i += 1
-                continue
-            in_number = False
-
-        out.append(BR2AR.get(ch, EXTRA_BR2AR.get(ch, "؟")))
-        i += 1
+    digits = _BR_DIGITS_ARABIC_TABLE if arabic_digits else _BR_DIGITS_LATIN_TABLE
+    table = _BR2AR_TABLES.get(unknown_policy, _BR2AR_TABLES["qmark"])
+
+    parts = _BR_TOKEN_RE.split(braille_text)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].translate(table)
+    for i in range(1, len(parts), 2):
+        tok = parts[i]
+        if tok == "⠦⠦":
+            parts[i] = "«"
+        elif tok == "⠴⠴":
+            parts[i] = "»"
+        else:
+            parts[i] = tok.translate(digits)
 
-    return "".join(out)
+    return "".join(parts)
 
 def do_convert(src: str, direction: str, keep_tashkeel: bool, arabic_digits_out: bool) -> str:
     if direction == "عربي → بريل":
@@ -262,90 +249,311 @@ def do_convert(src: str, direction: str, keep_tashkeel: bool, arabic_digits_out:
 # =========================
 # 4) PDF/TXT/OCR helpers
 # =========================
-def pdf_text_with_pypdf(pdf_bytes: bytes) -> str:
-    if PdfReader is None:
-        return ""
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    pages = []
-    for p in reader.pages:
-        pages.append(p.extract_text() or "")
+def pdf_text_with_fitz(doc, max_pages: int = 50) -> str:
+    # PyMuPDF مطلوب للـ OCR أصلًا، واستخراجه للنص أسرع بكثير من pypdf
+    pages = [doc.load_page(i).get_text("text") or "" for i in range(min(len(doc), max_pages))]
     return normalize_newlines("\n".join(pages)).strip()
 
+# tesserocr (اختياري) يبقي نموذج اللغة محمّلًا داخل العملية بدل تشغيل tesseract لكل صفحة؛
+# كائن PyTessBaseAPI غير آمن مع الخيوط، فيستعير كل خيط كائنًا من المجمّع ويعيده بعد الصفحة
+@st.cache_resource(show_spinner=False)
+def _tesserocr_pool(lang: str):
+    """نماذج tesserocr محمّلة لكل لغة، تبقى عبر إعادات التشغيل والجلسات ويستعيرها كل خيط OCR."""
+    try:
+        api = _optional("tesserocr").PyTessBaseAPI(lang=lang)
+    except Exception:
+        # tessdata غير متاح لـ tesserocr: نرجع إلى pytesseract
+        return None
+    pool = queue.SimpleQueue()
+    pool.put(api)
+    return pool
+
+def _ocr_backend(lang: str):
+    """مجمّع tesserocr إن أمكن تحميل النموذج، وإلا pytesseract، وإلا None (لا OCR).
+
+    يُستدعى من خيط السكربت فقط (cache_resource يحتاج سياق Streamlit) ثم يُمرَّر إلى خيوط OCR.
+    """
+    if _optional("tesserocr") is not None:
+        pool = _tesserocr_pool(lang)
+        if pool is not None:
+            return pool
+    return _optional("pytesseract")
+
+def _ocr_image(img, backend, lang: str, dpi: int | None = None) -> str:
+    # dpi معروف لصفحات PDF المرسومة: نمرّره لـ tesseract بدل أن يقدّره من صورة بلا دقة
+    if isinstance(backend, queue.SimpleQueue):
+        try:
+            api = backend.get_nowait()
+        except queue.Empty:
+            api = _optional("tesserocr").PyTessBaseAPI(lang=lang)
+        try:
+            api.SetImage(img)
+            if dpi:
+                api.SetSourceResolution(dpi)
+            text = api.GetUTF8Text()
+        finally:
+            backend.put(api)
+    else:
+        config = f"--dpi {dpi}" if dpi else ""
+        text = backend.image_to_string(img, lang=lang, config=config)
+    return normalize_newlines(text).strip()
+
+# صور الجوال (12 ميغابكسل وأكثر) أكبر بكثير مما يحتاجه tesseract: ضلع قصير 2000px ≈ 240 DPI لصفحة A4
+OCR_IMAGE_MAX_SIDE = 2000
+# عتبة OpenCV المحلية (نفس قيم تطبيق سطح المكتب)
+OCR_ADAPTIVE_BLOCK = 31
+OCR_ADAPTIVE_C = 10
+
+@st.cache_data(show_spinner=False, max_entries=8, ttl=3600)
 def ocr_image_bytes(image_bytes: bytes, lang: str = "ara") -> str:
-    if pytesseract is None or Image is None:
+    Image = _optional("PIL.Image")
+    backend = _ocr_backend(lang)
+    if backend is None or Image is None:
         raise RuntimeError("OCR غير متاح: تأكد من تثبيت pytesseract و Pillow، وتثبيت tesseract-ocr على الخادم.")
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    return normalize_newlines(pytesseract.image_to_string(img, lang=lang)).strip()
-
-def pdf_ocr_with_pymupdf(pdf_bytes: bytes, lang: str = "ara", max_pages: int = 10) -> str:
-    if fitz is None:
-        raise RuntimeError("PyMuPDF غير متاح (أضف PyMuPDF إلى requirements.txt).")
-    if pytesseract is None or Image is None:
+    img = Image.open(io.BytesIO(image_bytes))
+    short = min(img.size)
+    scale = OCR_IMAGE_MAX_SIDE / short if short > OCR_IMAGE_MAX_SIDE else 1.0
+    size = (round(img.width * scale), round(img.height * scale))
+    # JPEG: فك الترميز مباشرة بالرمادي وبدقة مخفّضة؛ tesseract يحوّل إلى الرمادي على أي حال
+    img.draft("L", size)
+    if img.mode != "L":
+        img = img.convert("L")
+    if img.size != size:
+        img = img.resize(size, Image.BOX)
+    # OpenCV (اختياري): عتبة محلية لصور الجوال غير متساوية الإضاءة، وtesseract يعمل أسرع على صورة بت واحد؛
+    # بدونه نترك الرمادي لعتبة Otsu داخل tesseract بدل عتبة ثابتة للصورة كلها
+    cv2, np = _optional("cv2"), _optional("numpy")
+    if cv2 is not None and np is not None:
+        bw = cv2.adaptiveThreshold(np.asarray(img), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY, OCR_ADAPTIVE_BLOCK, OCR_ADAPTIVE_C)
+        img = Image.fromarray(bw).convert("1", dither=Image.NONE)
+    return _ocr_image(img, backend, lang)
+
+# عدة عمليات tesseract تعمل بالتوازي (صفحة لكل عامل)، فنمنع كل واحدة من فتح خيوط OpenMP
+# بعدد الأنوية أيضًا وإلا تتزاحم على المعالج؛ يمكن تجاوز ذلك بضبط المتغير في البيئة
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# دقة OCR تلقائية لكل صفحة: 200 DPI معايَرة على خط 12pt، وتتناسب عكسيًا مع حجم الخط
+OCR_BASE_DPI = 200
+OCR_MIN_DPI = 150
+OCR_MAX_DPI = 300
+_DARK_BYTES = bytes(1 if v < 128 else 0 for v in range(256))
+
+def _page_text_size(page) -> tuple[float | None, bool]:
+    """Median text size in points and whether it was measured from ink.
+
+    From the PDF's own spans when there are any, else from dark row runs at 72 dpi.
+    """
+    sizes = [
+        span["size"]
+        for block in page.get_text("dict").get("blocks", [])
+        for line in block.get("lines", [])
+        for span in line.get("spans", [])
+        if span.get("text", "").strip()
+    ]
+    if sizes:
+        return statistics.median(sizes), False
+
+    # عند 72 DPI البكسل = نقطة، فارتفاع سطر الحبر يقارب حجم الخط
+    pix = page.get_pixmap(dpi=72, colorspace=_optional("fitz").csGRAY, alpha=False)
+    min_dark = max(2, pix.width // 200)
+    # pix.samples ينسخ البكسلات كلها عند كل وصول: نأخذه مرة واحدة خارج الحلقة
+    samples, stride = pix.samples, pix.stride
+    runs, run = [], 0
+    for y in range(pix.height):
+        row = samples[y * stride:y * stride + pix.width]
+        if row.translate(_DARK_BYTES).count(1) >= min_dark:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+    runs = [r for r in runs if r >= 3]
+    return (statistics.median(runs) if runs else None), True
+
+def _auto_ocr_dpi(page) -> int:
+    size, from_ink = _page_text_size(page)
+    if not size:
+        return OCR_BASE_DPI
+    dpi = round(OCR_BASE_DPI * 12 / size / 25) * 25
+    # ارتفاع الحبر يشمل الصواعد والنوازل فيزيد على حجم الخط: نرفع الدقة للخط الصغير ولا نخفضها
+    low = OCR_BASE_DPI if from_ink else OCR_MIN_DPI
+    return int(min(OCR_MAX_DPI, max(low, dpi)))
+
+# كل عامل عملية tesseract بذاكرتها ونموذج لغتها؛ بعد ~4 عمال يقل الكسب وتكبر الذاكرة
+OCR_MAX_WORKERS = 4
+
+def _ocr_workers(page_count: int) -> int:
+    # os.cpu_count() يعيد أنوية المضيف كله داخل الحاويات؛ المسموح لهذه العملية أدق
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, min(page_count, cpus, OCR_MAX_WORKERS))
+
+# نص OCR لكل صفحة يبقى عبر الجلسات: زيادة عدد صفحات OCR لا تعيد ما سبق من الصفحات
+OCR_PAGE_CACHE_SIZE = 500
+
+@st.cache_resource(show_spinner=False)
+def _ocr_page_cache() -> dict:
+    return {}
+
+def pdf_ocr_with_pymupdf(doc, lang: str = "ara", max_pages: int = 10, dpi: int | None = None,
+                         doc_key: str | None = None) -> str:
+    """OCR لأول max_pages صفحة؛ مع doc_key (بصمة محتوى الملف) تُحفظ نتيجة كل صفحة وتُعاد دون OCR."""
+    fitz = _optional("fitz")
+    Image = _optional("PIL.Image")
+    backend = _ocr_backend(lang)
+    if backend is None or Image is None:
         raise RuntimeError("OCR غير متاح (pytesseract/Pillow).")
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    texts = []
     n = min(len(doc), max_pages)
+
+    cache = _ocr_page_cache() if doc_key else {}
+    results: dict[int, str] = {}
+    todo = []
     for i in range(n):
-        pix = doc[i].get_pixmap(dpi=200)
-        img_bytes = pix.tobytes("png")
-        t = ocr_image_bytes(img_bytes, lang=lang)
-        if t:
-            texts.append(t)
+        hit = cache.get((doc_key, i, lang, dpi))
+        if hit is None:
+            todo.append(i)
+        else:
+            results[i] = hit
+
+    # tesseract عملية مستقلة لكل صفحة: الخيوط تكفي للتوازي، والرسم يبقى بالتتابع (fitz غير آمن مع الخيوط)
+    workers = _ocr_workers(len(todo))
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i in todo:
+            page = doc[i]
+            # PDF مختلط: صفحة لها طبقة نص كافية لا تحتاج OCR
+            layer = page.get_text("text").strip()
+            if len(layer) >= PDF_TEXT_MIN_CHARS:
+                results[i] = normalize_newlines(layer)
+                continue
+            page_dpi = dpi or _auto_ocr_dpi(page)
+            pix = page.get_pixmap(dpi=page_dpi, colorspace=fitz.csGRAY, alpha=False)
+            # البكسلات الخام مباشرة (مع stride) من دون ترميز/فك PNG
+            mode = "L" if pix.n == 1 else "RGB"
+            img = Image.frombytes(mode, (pix.width, pix.height), pix.samples, "raw", mode, pix.stride)
+            del pix
+            pending[pool.submit(_ocr_image, img, backend, lang, page_dpi)] = i
+            # لا نرسم أكثر من صفحتين لكل عامل مسبقًا حتى لا تتراكم الصور في الذاكرة
+            if len(pending) >= 2 * workers:
+                ready, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in ready:
+                    results[pending.pop(fut)] = fut.result()
+        for fut in as_completed(list(pending)):
+            results[pending.pop(fut)] = fut.result()
+
+    if doc_key:
+        for i in todo:
+            cache[(doc_key, i, lang, dpi)] = results[i]
+        # الأقدم أولًا (ترتيب الإدراج)
+        for old_key in list(cache)[:max(0, len(cache) - OCR_PAGE_CACHE_SIZE)]:
+            cache.pop(old_key, None)
+
+    texts = [results[i] for i in range(n) if results[i]]
     return "\n\n".join(texts).strip()
 
+# أقل من هذا في أول صفحات الملف يعني PDF ممسوحًا (نفس عتبة تطبيق سطح المكتب)
+PDF_TEXT_MIN_CHARS = 60
+PDF_PROBE_PAGES = 3
+
+# Streamlit يعيد تنفيذ الملف عند كل نقرة والملف المرفوع باقٍ، فنخزّن النتيجة حسب محتوى الملف والإعدادات
+@st.cache_data(show_spinner=False, max_entries=8, ttl=3600)
+def pdf_to_text(pdf_bytes: bytes, lang: str = "ara", text_pages: int = 50, ocr_pages: int = 10) -> tuple[str, bool]:
+    """نص الـ PDF المباشر، وإلا OCR على المستند المفتوح نفسه. يعيد (النص، هل استُعمل OCR)."""
+    fitz = _optional("fitz")
+    if fitz is None:
+        raise RuntimeError("PyMuPDF غير متاح (أضف PyMuPDF إلى requirements.txt).")
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        # فحص أول صفحات فقط: الملف الممسوح يذهب إلى OCR دون المرور على كل صفحاته
+        try:
+            probe = pdf_text_with_fitz(doc, max_pages=min(PDF_PROBE_PAGES, text_pages))
+            text = probe
+            if len(probe) >= PDF_TEXT_MIN_CHARS and text_pages > PDF_PROBE_PAGES:
+                text = pdf_text_with_fitz(doc, max_pages=text_pages)
+        except Exception:
+            text = ""
+        if len(text) >= PDF_TEXT_MIN_CHARS:
+            return text, False
+        doc_key = hashlib.blake2b(pdf_bytes, digest_size=16).hexdigest()
+        return pdf_ocr_with_pymupdf(doc, lang=lang, max_pages=ocr_pages, doc_key=doc_key), True
+    finally:
+        doc.close()
+
 
 # =========================
 # 5) Export helpers
 # =========================
+@st.cache_data(show_spinner=False, max_entries=4)
 def export_to_word_bytes(text: str) -> bytes:
+    Document = _optional("docx", "Document")
     if Document is None:
         raise RuntimeError("تصدير Word غير متاح: ثبّت python-docx")
     doc = Document()
-    for line in normalize_newlines(text).split("\n"):
-        doc.add_paragraph(line)
+    # فقرة واحدة: python-docx يحوّل كل \n إلى فاصل سطر، وهو أسرع بكثير من فقرة لكل سطر
+    doc.add_paragraph(normalize_newlines(text))
     buf = io.BytesIO()
     doc.save(buf)
     return buf.getvalue()
 
+@functools.lru_cache(maxsize=4096)
 def _shape_arabic(text: str) -> str:
+    if not text.strip():
+        return text
+    arabic_reshaper = _optional("arabic_reshaper")
+    get_display = _optional("bidi.algorithm", "get_display")
     if arabic_reshaper and get_display:
         return get_display(arabic_reshaper.reshape(text))
     return text
 
+# cache_resource يبقى بين إعادات تشغيل Streamlit (بخلاف متغيرات هذا الملف)، كما يبقى سجل خطوط reportlab
+@st.cache_resource(show_spinner=False)
+def _register_pdf_font() -> str:
+    """يسجّل خط DejaVuSans مرة واحدة ويعيد اسم الخط المتاح (أو Helvetica)."""
+    pdfmetrics = _optional("reportlab.pdfbase.pdfmetrics")
+    TTFont = _optional("reportlab.pdfbase.ttfonts", "TTFont")
+    if not (pdfmetrics and TTFont):
+        return "Helvetica"
+    candidates = [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSansCondensed.ttf",
+    ]
+    for fp in candidates:
+        try:
+            pdfmetrics.registerFont(TTFont("DejaVuSans", fp))
+            return "DejaVuSans"
+        except Exception:
+            pass
+    return "Helvetica"
+
+@st.cache_data(show_spinner=False, max_entries=4)
 def export_to_pdf_bytes(text: str, assume_arabic: bool = True) -> bytes:
+    rl_canvas = _optional("reportlab.pdfgen.canvas")
+    A4 = _optional("reportlab.lib.pagesizes", "A4")
     if rl_canvas is None or A4 is None:
         raise RuntimeError("تصدير PDF غير متاح: ثبّت reportlab")
     buf = io.BytesIO()
     c = rl_canvas.Canvas(buf, pagesize=A4)
     _, height = A4
     margin = 50
-    y = height - margin
+    leading = 18
+    lines_per_page = int((height - 2 * margin) // leading) + 1
 
-    font_name = "Helvetica"
-    if pdfmetrics and TTFont:
-        candidates = [
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSansCondensed.ttf",
-        ]
-        for fp in candidates:
-            try:
-                pdfmetrics.registerFont(TTFont("DejaVuSans", fp))
-                font_name = "DejaVuSans"
-                break
-            except Exception:
-                pass
+    font_name = _register_pdf_font()
 
-    c.setFont(font_name, 12)
-
-    for line in normalize_newlines(text).split("\n"):
-        if y < margin:
+    lines = normalize_newlines(text).split("\n")
+    # كائن نص واحد لكل صفحة بدل drawString لكل سطر
+    for page_no, first in enumerate(range(0, len(lines), lines_per_page)):
+        if page_no:
             c.showPage()
-            c.setFont(font_name, 12)
-            y = height - margin
-
-        draw_line = _shape_arabic(line) if assume_arabic else line
-        c.drawString(margin, y, draw_line)
-        y -= 18
+        tx = c.beginText(margin, height - margin)
+        tx.setFont(font_name, 12, leading)
+        for line in lines[first:first + lines_per_page]:
+            tx.textLine(_shape_arabic(line) if assume_arabic else line)
+        c.drawText(tx)
 
     c.save()
     return buf.getvalue()
@@ -378,66 +586,103 @@ with st.sidebar:
         type=["txt", "pdf", "png", "jpg", "jpeg"],
         key="uploader_main",
     )
+    pdf_text_pages = st.slider("عدد صفحات PDF النصي", 1, 500, 50, key="pdf_text_pages")
 
     st.subheader("خيارات OCR (للصور/الـ PDF الممسوح)")
     ocr_lang = st.selectbox("لغة OCR", ["ara", "eng"], index=0, key="ocr_lang")
+    # تحميل نموذج اللغة مرة واحدة للخادم كله، فلا ينتظره أول ملف يُرفع
+    if _optional("tesserocr") is not None:
+        _tesserocr_pool(ocr_lang)
     pdf_ocr_pages = st.slider("عدد صفحات OCR (للـ PDF الممسوح)", 1, 40, 10, key="pdf_ocr_pages")
 
     st.divider()
     auto_convert = st.checkbox("تحويل تلقائي بعد الرفع", value=True, key="auto_convert")
 
+def _convert_lines(src: str, opts: tuple) -> str:
+    """تحويل سطرًا بسطر يعيد استعمال أسطر التحويل السابق بالإعدادات نفسها؛ فتعديل سطر لا يعيد تحويل الكل."""
+    direction, keep_tashkeel, arabic_digits_out = opts
+    lines = normalize_newlines(src).split("\n")
+    memo_opts, memo = st.session_state.get("_line_memo", (None, None))
+    if memo_opts != opts:
+        # أول تحويل بهذه الإعدادات: النص كله دفعة واحدة (أسرع)، وكل سطر يقابله سطر في الناتج
+        out = do_convert(src, direction, keep_tashkeel, arabic_digits_out)
+        out_lines = out.split("\n")
+    else:
+        out_lines = [
+            memo[line] if line in memo else do_convert(line, direction, keep_tashkeel, arabic_digits_out)
+            for line in lines
+        ]
+        out = "\n".join(out_lines)
+    # نحتفظ بأسطر آخر تحويل فقط حتى لا تكبر الذاكرة مع التعديلات
+    st.session_state["_line_memo"] = (opts, dict(zip(lines, out_lines)))
+    return out
+
+def convert_to_output():
+    """يحوّل in_text إلى out_text، ويتخطى التحويل إن لم يتغير المدخل والإعدادات والناتج منذ آخر مرة."""
+    key = hash((st.session_state["in_text"], direction, keep_tashkeel, arabic_digits_out))
+    last = st.session_state.get("_last_convert")
+    if last and last[0] == key and last[1] == hash(st.session_state["out_text"]):
+        return
+    out = _convert_lines(st.session_state["in_text"], (direction, keep_tashkeel, arabic_digits_out))
+    st.session_state["out_text"] = out
+    st.session_state["_last_convert"] = (key, hash(out))
+
 # ---------- رفع الملفات: إدراج مباشر في مربع النص ----------
 if uploaded is not None:
-    name = (uploaded.name or "").lower()
-    data = uploaded.getvalue()
-
-    inserted_text = ""
-    note = ""
+    # الملف المرفوع يبقى مع كل إعادة تشغيل: نقرؤه ونستخرج نصه مرة واحدة لكل ملف وإعدادات،
+    # فلا ننسخ محتواه من جديد ولا نكتب فوق تعديلات المستخدم على مربع النص عند كل نقرة
+    upload_key = (
+        getattr(uploaded, "file_id", None) or (uploaded.name, uploaded.size),
+        ocr_lang, pdf_ocr_pages, pdf_text_pages,
+    )
+    if st.session_state.get("_upload_key") != upload_key:
+        st.session_state["_upload_key"] = upload_key
+        name = (uploaded.name or "").lower()
+        data = uploaded.getvalue()
 
-    if name.endswith(".txt"):
-        inserted_text = normalize_newlines(data.decode("utf-8", errors="replace"))
-        note = "تم إدراج TXT في مربع النص."
+        inserted_text = ""
+        note = ""
 
-    elif name.endswith((".png", ".jpg", ".jpeg")):
-        try:
-            inserted_text = ocr_image_bytes(data, lang=ocr_lang)
-            note = "تم OCR للصورة وإدراج النص."
-        except Exception as e:
-            note = f"OCR فشل: {e}"
+        if name.endswith(".txt"):
+            inserted_text = normalize_newlines(data.decode("utf-8", errors="replace"))
+            note = "تم إدراج TXT في مربع النص."
 
-    elif name.endswith(".pdf"):
-        # 1) محاولة استخراج نص
-        try:
-            inserted_text = pdf_text_with_pypdf(data)
-        except Exception:
-            inserted_text = ""
+        elif name.endswith((".png", ".jpg", ".jpeg")):
+            try:
+                inserted_text = ocr_image_bytes(data, lang=ocr_lang)
+                note = "تم OCR للصورة وإدراج النص."
+            except Exception as e:
+                note = f"OCR فشل: {e}"
 
-        if inserted_text.strip():
-            note = "تم استخراج نص PDF (نصي) وإدراجه."
-        else:
-            # 2) OCR للـ PDF الممسوح
+        elif name.endswith(".pdf"):
+            # 1) محاولة استخراج نص، 2) وإلا OCR للـ PDF الممسوح
             try:
-                inserted_text = pdf_ocr_with_pymupdf(data, lang=ocr_lang, max_pages=pdf_ocr_pages)
-                if inserted_text.strip():
+                inserted_text, used_ocr = pdf_to_text(
+                    data, lang=ocr_lang, text_pages=pdf_text_pages, ocr_pages=pdf_ocr_pages,
+                )
+                if not used_ocr:
+                    note = "تم استخراج نص PDF (نصي) وإدراجه."
+                elif inserted_text.strip():
                     note = "PDF ممسوح: تم OCR وإدراج النص."
                 else:
                     note = "PDF ممسوح: OCR لم يستخرج نصًا (قد تكون جودة المسح ضعيفة)."
             except Exception as e:
                 note = f"PDF ممسوح: فشل OCR: {e}"
 
-    # ✅ إدراج مباشر في مربع النص الأصلي
-    if inserted_text.strip():
-        st.session_state["in_text"] = inserted_text
-        if st.session_state.get("auto_convert", True):
-            st.session_state["out_text"] = do_convert(
-                st.session_state["in_text"],
-                direction=direction,
-                keep_tashkeel=keep_tashkeel,
-                arabic_digits_out=arabic_digits_out,
-            )
+        # ✅ إدراج مباشر في مربع النص الأصلي
+        if inserted_text.strip():
+            st.session_state["in_text"] = inserted_text
+            if st.session_state.get("auto_convert", True):
+                convert_to_output()
+            st.session_state["_upload_note"] = (True, note)
+        else:
+            st.session_state["_upload_note"] = (False, note if note else "لم يتم استخراج أي نص من الملف.")
+
+    ok, note = st.session_state["_upload_note"]
+    if ok:
         st.sidebar.success(note)
     else:
-        st.sidebar.warning(note if note else "لم يتم استخراج أي نص من الملف.")
+        st.sidebar.warning(note)
 
 # ---------- واجهة النص ----------
 col1, col2 = st.columns(2, gap="large")
@@ -465,12 +710,7 @@ b1, b2, b3, b4 = st.columns([1, 1, 1, 1], gap="small")
 
 with b1:
     if st.button("تحويل الآن", use_container_width=True, key="btn_convert"):
-        st.session_state["out_text"] = do_convert(
-            st.session_state["in_text"],
-            direction=direction,
-            keep_tashkeel=keep_tashkeel,
-            arabic_digits_out=arabic_digits_out,
-        )
+        convert_to_output()
 
 with b2:
     if st.button("تبديل (Swap)", use_container_width=True, key="btn_swap"):
@@ -481,11 +721,18 @@ with b3:
         st.session_state["in_text"] = ""
         st.session_state["out_text"] = ""
 
+# ملف TXT يُبنى فقط عند تغيّر الناتج، لا عند كل إعادة تشغيل (Word/PDF تُجهَّز عند الطلب أدناه)
+out_text = st.session_state["out_text"] or ""
+payload = st.session_state.get("_out_payload")
+if payload is None or payload[0] != hash(out_text):
+    payload = (hash(out_text), out_text.encode("utf-8"), datetime.now().strftime("%Y%m%d-%H%M%S"))
+    st.session_state["_out_payload"] = payload
+_, txt_bytes, now = payload
+
 with b4:
-    now = datetime.now().strftime("%Y%m%d-%H%M%S")
     st.download_button(
         "تحميل الناتج TXT",
-        data=(st.session_state["out_text"] or "").encode("utf-8"),
+        data=txt_bytes,
         file_name=f"output-{now}.txt",
         mime="text/plain; charset=utf-8",
         use_container_width=True,
@@ -495,7 +742,14 @@ with b4:
 # ---------- تقرير الرموز غير المدعومة (اختياري ومفيد) ----------
 with st.expander("تقرير: رموز غير مدعومة (عربي → بريل)", expanded=False):
     if direction == "عربي → بريل":
-        bad = unsupported_report_ar_to_br(st.session_state["in_text"], keep_tashkeel=keep_tashkeel)
+        # التقرير يُعرض مع كل إعادة تشغيل: نعيد فحص النص فقط إذا تغيّر (hash النص المخزّن في الجلسة محفوظ فيه)
+        report_key = hash((st.session_state["in_text"], keep_tashkeel))
+        cached_report = st.session_state.get("_report")
+        if cached_report and cached_report[0] == report_key:
+            bad = cached_report[1]
+        else:
+            bad = unsupported_report_ar_to_br(st.session_state["in_text"], keep_tashkeel=keep_tashkeel)
+            st.session_state["_report"] = (report_key, bad)
         if not bad:
             st.success("✅ لا توجد رموز غير مدعومة.")
         else:
@@ -508,40 +762,66 @@ with st.expander("تقرير: رموز غير مدعومة (عربي → بري
 st.divider()
 
 # ---------- التصدير ----------
-e1, e2, e3 = st.columns(3)
+# ملفات Word/PDF لا تُبنى مع كل إعادة تشغيل: تُجهَّز عند الطلب وتبقى في الجلسة ما دام الناتج نفسه
+def _prepared_export(slot: str, key, label: str, build):
+    """يعيد بايتات التصدير المجهّزة للناتج الحالي، أو يعرض زر التجهيز ويعيد None."""
+    prepared = st.session_state.get(slot)
+    if prepared is not None and prepared[0] == key:
+        return prepared[1]
+    if st.button(label, key=f"{slot}_prepare", use_container_width=True):
+        data = build()
+        st.session_state[slot] = (key, data)
+        return data
+    return None
+
+# داخل fragment: زر التجهيز وزر التحميل يعيدان تشغيل هذا القسم وحده لا التطبيق كله
+@st.fragment
+def _export_section():
+    out_text = st.session_state["out_text"] or ""
+    out_key, _, now = st.session_state["_out_payload"]
+    direction = st.session_state["dir_radio"]
+    e1, e2, e3 = st.columns(3)
+
+    with e1:
+        if not _installed("docx"):
+            st.caption("Word: غير متاح (python-docx غير مثبت).")
+        else:
+            try:
+                word_bytes = _prepared_export(
+                    "_word_export", out_key, "تجهيز Word (.docx)", lambda: export_to_word_bytes(out_text),
+                )
+                if word_bytes is not None:
+                    st.download_button(
+                        "تصدير Word (.docx)",
+                        data=word_bytes,
+                        file_name=f"output-{now}.docx",
+                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                        key="btn_word",
+                        use_container_width=True,
+                    )
+            except Exception as e:
+                st.error(f"فشل Word: {e}")
 
-with e1:
-    if Document is None:
-        st.caption("Word: غير متاح (python-docx غير مثبت).")
-    else:
+    with e2:
         try:
-            word_bytes = export_to_word_bytes(st.session_state["out_text"])
-            st.download_button(
-                "تصدير Word (.docx)",
-                data=word_bytes,
-                file_name=f"output-{now}.docx",
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                key="btn_word",
-                use_container_width=True,
+            assume_arabic = (direction == "بريل → عربي")
+            pdf_bytes = _prepared_export(
+                "_pdf_export", (out_key, assume_arabic), "تجهيز PDF (.pdf)",
+                lambda: export_to_pdf_bytes(out_text, assume_arabic=assume_arabic),
             )
+            if pdf_bytes is not None:
+                st.download_button(
+                    "تصدير PDF (.pdf)",
+                    data=pdf_bytes,
+                    file_name=f"output-{now}.pdf",
+                    mime="application/pdf",
+                    key="btn_pdf",
+                    use_container_width=True,
+                )
         except Exception as e:
-            st.error(f"فشل Word: {e}")
+            st.error(f"فشل PDF: {e}")
 
-with e2:
-    try:
-        assume_arabic = (direction == "بريل → عربي")
-        pdf_bytes = export_to_pdf_bytes(st.session_state["out_text"], assume_arabic=assume_arabic)
-        st.download_button(
-            "تصدير PDF (.pdf)",
-            data=pdf_bytes,
-            file_name=f"output-{now}.pdf",
-            mime="application/pdf",
-            key="btn_pdf",
-            use_container_width=True,
-        )
-    except Exception as e:
-        st.error(f"فشل PDF: {e}")
-
-with e3:
-    st.caption("ملاحظة: التحويل تعليمي وقد لا يطابق معيار بريل العربي 100% في الاختصارات والترقيم.")
+    with e3:
+        st.caption("ملاحظة: التحويل تعليمي وقد لا يطابق معيار بريل العربي 100% في الاختصارات والترقيم.")
 
+_export_section()
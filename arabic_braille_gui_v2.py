@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import functools
 import re
 import tkinter as tk
 from tkinter import filedialog, messagebox
@@ -34,12 +35,11 @@ except ImportError:
 TASHKEEL_RE = re.compile(r'[\u0617-\u061A\u064B-\u0652\u0670\u0653-\u0655]')
 
 
-def remove_tashkeel(text: str) -> str:
-    return re.sub(TASHKEEL_RE, '', text)
-
-
 def normalize_newlines(text: str) -> str:
     # يحوّل كل أنواع نهاية السطر إلى \n (يحل مشكلة \r التي كانت تنتج ⍰)
+    # معظم النصوص بلا \r أصلًا: فحص واحد يغني عن نسختين كاملتين من النص
+    if '\r' not in text:
+        return text
     return text.replace('\r\n', '\n').replace('\r', '\n')
 
 
@@ -128,87 +128,88 @@ EXTRA_BR2AR = {
     '⠦': '؟',
 }
 
-ALEF_FORMS = {'ا', 'أ', 'إ', 'آ'}
-
 
 # =========================
 # 4) محرك التحويل
 # =========================
-def normalize_digits_to_latin(text: str) -> str:
-    return ''.join(ARABIC_DIGITS_TO_LATIN.get(ch, ch) for ch in text)
-
+class _FallbackTable(dict):
+    """جدول str.translate يعيد قيمة ثابتة لأي محرف غير موجود فيه."""
 
-def arabic_to_braille(text: str, keep_tashkeel: bool = False) -> str:
-    text = normalize_newlines(text)
-    if not keep_tashkeel:
-        text = remove_tashkeel(text)
-    text = normalize_digits_to_latin(text)
+    def __init__(self, mapping: dict, fallback: str):
+        super().__init__(mapping)
+        self.fallback = fallback
 
-    out = []
-    i = 0
-    in_number = False
+    def __missing__(self, cp: int) -> str:
+        self[cp] = self.fallback
+        return self.fallback
 
-    while i < len(text):
-        # تحسين "لا" بمختلف أشكال الألف: لا / لأ / لإ / لآ
-        if i + 1 < len(text) and text[i] == 'ل' and text[i + 1] in ALEF_FORMS:
-            in_number = False
-            out.append(AR2BR.get('ل', '⍰'))
-            out.append(AR2BR.get(text[i + 1], '⍰'))
-            i += 2
-            continue
 
-        ch = text[i]
+# حذف التشكيل مدموج في جداول الترجمة بدل مرور مستقل على النص
+_TASHKEEL_CHARS = ''.join(ch for ch in map(chr, range(0x0600, 0x0700)) if TASHKEEL_RE.match(ch))
+_DROP_TASHKEEL = dict.fromkeys(map(ord, _TASHKEEL_CHARS))
 
-        if ch.isdigit():
-            if not in_number:
-                out.append(NUM_SIGN)
-                in_number = True
-            out.append(DIGIT_TO_BR.get(ch, '⍰'))
-            i += 1
-            continue
+# "لا" وأشكال الألف: ناتجها خلية ل + خلية الألف كما في الجدول، فلا تحتاج فرعًا خاصًا
+_AR2BR_BASE = str.maketrans({k: v for k, v in AR2BR.items() if len(k) == 1})
+_AR2BR_TABLES = {
+    True: _FallbackTable(_AR2BR_BASE, '⍰'),
+    False: _FallbackTable({**_AR2BR_BASE, **_DROP_TASHKEEL}, '⍰'),
+}
+# سلسلة الرقم هي \d (كل أرقام يونيكود العشرية، مثل str.isdecimal) في الوحدات الثلاث؛
+# ما ليس لاتينيًا أو هنديًا منها يصبح ⍰ بعد إشارة الرقم
+_DIGIT_TABLE = _FallbackTable({
+    **str.maketrans(DIGIT_TO_BR),
+    **str.maketrans({ar: DIGIT_TO_BR[lat] for ar, lat in ARABIC_DIGITS_TO_LATIN.items()}),
+    **_DROP_TASHKEEL,
+}, '⍰')
+# عند حذف التشكيل: حركة بين رقمين لا تقطع سلسلة الأرقام (كما لو حُذفت أولًا)
+_DIGIT_RUN_RES = {
+    True: re.compile(r'(\d+)'),
+    False: re.compile(r'(\d(?:[' + _TASHKEEL_CHARS + r']*\d)*)'),
+}
 
-        in_number = False
-        out.append(AR2BR.get(ch, '⍰'))
-        i += 1
 
-    return ''.join(out)
+def arabic_to_braille(text: str, keep_tashkeel: bool = False) -> str:
+    text = normalize_newlines(text)
+    keep_tashkeel = bool(keep_tashkeel)
+    table = _AR2BR_TABLES[keep_tashkeel]
+
+    # الأجزاء الزوجية نص عادي، والفردية سلاسل أرقام تُسبق بإشارة الرقم
+    parts = _DIGIT_RUN_RES[keep_tashkeel].split(text)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].translate(table)
+    for i in range(1, len(parts), 2):
+        parts[i] = NUM_SIGN + parts[i].translate(_DIGIT_TABLE)
+
+    return ''.join(parts)
+
+
+# جدول عكسي واحد لكل خلية: حروف BR2AR لها الأولوية على EXTRA_BR2AR، وأي خلية أخرى تصبح "؟"
+# (مفاتيح BR2AR متعددة الخلايا مثل ⠺⠄ لا تُطابَق في القراءة خلية بخلية)
+_BR2AR_TABLE = _FallbackTable(str.maketrans({
+    **EXTRA_BR2AR,
+    **{k: v for k, v in BR2AR.items() if len(k) == 1},
+}), '؟')
+_BR_DIGITS_LATIN_TABLE = str.maketrans({**BR_TO_DIGIT, NUM_SIGN: None})
+_BR_DIGITS_ARABIC_TABLE = str.maketrans({
+    **{k: LATIN_TO_ARABIC_DIGITS[v] for k, v in BR_TO_DIGIT.items()},
+    NUM_SIGN: None,
+})
+# إشارة رقم تتبعها خلايا أرقام (وإشارات رقم مكررة)؛ أي خلية أخرى تنهي الرقم
+_BR_NUMBER_RE = re.compile('(' + NUM_SIGN + '[' + NUM_SIGN + ''.join(BR_TO_DIGIT) + ']*)')
 
 
 def braille_to_arabic(braille_text: str, arabic_digits: bool = False) -> str:
     braille_text = normalize_newlines(braille_text)
+    digits = _BR_DIGITS_ARABIC_TABLE if arabic_digits else _BR_DIGITS_LATIN_TABLE
 
-    out = []
-    i = 0
-    in_number = False
-
-    while i < len(braille_text):
-        ch = braille_text[i]
-
-        if ch == NUM_SIGN:
-            in_number = True
-            i += 1
-            continue
-
-        if ch in [' ', '\n', '\t']:
-            in_number = False
-            out.append(ch)
-            i += 1
-            continue
-
-        if in_number:
-            digit = BR_TO_DIGIT.get(ch)
-            if digit is not None:
-                out.append(LATIN_TO_ARABIC_DIGITS[digit] if arabic_digits else digit)
-            else:
-                in_number = False
-                out.append(BR2AR.get(ch, EXTRA_BR2AR.get(ch, '؟')))
-            i += 1
-            continue
-
-        out.append(BR2AR.get(ch, EXTRA_BR2AR.get(ch, '؟')))
-        i += 1
+    # الأجزاء الزوجية خلايا حروف، والفردية أرقام تبدأ بإشارة الرقم
+    parts = _BR_NUMBER_RE.split(braille_text)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].translate(_BR2AR_TABLE)
+    for i in range(1, len(parts), 2):
+        parts[i] = parts[i].translate(digits)
 
-    return ''.join(out)
+    return ''.join(parts)
 
 
 # =========================
@@ -234,11 +235,13 @@ def export_to_word(text: str, path_out: str):
     if Document is None:
         raise RuntimeError("python-docx غير مثبت. ثبّته بالأمر: pip install python-docx")
     doc = Document()
-    for line in normalize_newlines(text).split('\n'):
-        doc.add_paragraph(line)
+    # فقرة واحدة: python-docx يحوّل كل \n إلى فاصل سطر، وهو أسرع بكثير من فقرة لكل سطر
+    doc.add_paragraph(normalize_newlines(text))
     doc.save(path_out)
 
 
+# الأسطر المتكررة (فارغة، عناوين…) تُشكَّل مرة واحدة
+@functools.lru_cache(maxsize=4096)
 def _shape_arabic_for_pdf_if_possible(text: str) -> str:
     if arabic_reshaper is not None and get_display is not None:
         reshaped = arabic_reshaper.reshape(text)